@@ -0,0 +1 @@
+"""Standalone benchmarks for the rinnai_smart client stack."""
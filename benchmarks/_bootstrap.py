@@ -0,0 +1,17 @@
+"""Import the integration's client modules without Home Assistant.
+
+The package __init__ imports Home Assistant, which the client modules do not
+need. Registering a bare package object lets their relative imports resolve.
+"""
+
+import pathlib
+import sys
+import types
+
+PACKAGE = "rinnai_smart"
+PACKAGE_DIR = pathlib.Path(__file__).resolve().parents[1] / "custom_components" / PACKAGE
+
+if PACKAGE not in sys.modules:
+    package = types.ModuleType(PACKAGE)
+    package.__path__ = [str(PACKAGE_DIR)]
+    sys.modules[PACKAGE] = package
@@ -0,0 +1,192 @@
+"""End-to-end throughput of MQTTClient.run -> RinnaiClient._on_message -> subscriber.
+
+The stand-in HTTP API and MQTT broker run in a child process, so CPU time and
+memory measured here belong to the client side only. Every simulated device
+publishes full 16-item res/ frames; the send time travels inside the frame
+so latency covers broker delivery, decode, change detection and dispatch.
+Subscribers read the same derived values the coordinator properties do, as a
+stand-in for entity state writes (Home Assistant itself is not started).
+
+Run from the repository root:
+    python -m benchmarks.bench_e2e --accounts 4 --devices 8 --rate 20 --duration 10
+"""
+
+import argparse
+import asyncio
+import multiprocessing
+import resource
+import statistics
+import time
+
+from . import _bootstrap  # noqa: F401
+from .standins import FakeBroker, FakeRinnaiAPI, make_device
+
+from rinnai_smart.rinnai_client import RinnaiClient
+
+PASSWORD = "benchmark"
+
+FRAME_TEMPLATE = (
+    '{"ptn":"J00","code":"FFFF", "id":"0F060G55","sum":"17", "enl":[ '
+    '{"id":"errorCode","data":"0"}, {"id":"burningState","data":"%(burning)s"}, '
+    '{"id":"operationMode","data":"C2"}, {"id":"hotWaterTempSetting","data":"26"}, '
+    '{"id":"bathWaterInjectionSetting","data":"0096"}, {"id":"waterInjectionStatus","data":"0"}, '
+    '{"id":"remainingWater","data":"0096"}, {"id":"faucetNotCloseSign","data":"1"}, '
+    '{"id":"hotWaterUseableSign","data":"0"}, {"id":"cycleModeSetting","data":"2"}, '
+    '{"id":"cycleReservationTimeSetting","data":"00 00 00"}, '
+    '{"id":"temporaryCycleInsulationSetting","data":"1"}, {"id":"cycleReservationSetting","data":"1"}, '
+    '{"id":"waterInjectionCompleteConfirm","data":"0"}, {"id":"childLock","data":"0"}, '
+    '{"id":"priority","data":"1"}, {"id":"benchSentNs","data":"%(sent)d"} ],"It":"%(seq)d"}'
+)
+
+
+def accounts_for(n_accounts: int, n_devices: int) -> dict[str, list[dict]]:
+    return {
+        f"bench{account}": [make_device(account, index) for index in range(n_devices)]
+        for account in range(n_accounts)
+    }
+
+
+async def _serve(conn, n_accounts: int, n_devices: int) -> None:
+    accounts = accounts_for(n_accounts, n_devices)
+    api, broker = FakeRinnaiAPI(accounts), FakeBroker()
+    base_url = await api.start()
+    await broker.start()
+    conn.send((base_url, broker.port))
+    loop = asyncio.get_running_loop()
+    topics = [
+        f"rinnai/SR/01/SR/{device['mac']}/res/"
+        for devices in accounts.values()
+        for device in devices
+    ]
+    while True:
+        command, *args = await loop.run_in_executor(None, conn.recv)
+        if command == "subscriptions":
+            conn.send(broker.subscription_count)
+        elif command == "emit":
+            rate, duration = args
+            interval = 1 / rate
+            seq = 0
+            start = time.monotonic()
+            while time.monotonic() - start < duration:
+                tick = time.monotonic()
+                for topic in topics:
+                    seq += 1
+                    payload = FRAME_TEMPLATE % {
+                        "burning": seq & 1,
+                        "sent": time.monotonic_ns(),
+                        "seq": seq,
+                    }
+                    broker.publish(topic, payload.encode("utf-8"))
+                await broker.drain()
+                await asyncio.sleep(max(0.0, interval - (time.monotonic() - tick)))
+            conn.send(seq)
+        elif command == "stop":
+            break
+    await broker.stop()
+    await api.stop()
+
+
+def _standins_main(conn, n_accounts: int, n_devices: int) -> None:
+    asyncio.run(_serve(conn, n_accounts, n_devices))
+
+
+class Sink:
+    """Subscriber standing in for the coordinator and its entities."""
+
+    def __init__(self):
+        self.latencies_ns: list[int] = []
+
+    async def on_update(self, info: dict, changed: frozenset) -> None:
+        if "benchSentNs" not in changed:
+            return
+        # What the water_heater, select and binary_sensor properties compute.
+        int(info["hotWaterTempSetting"], 16)
+        int(info["operationMode"], 16) & 0xBF
+        info["burningState"] == "1"
+        self.latencies_ns.append(time.monotonic_ns() - int(info["benchSentNs"]))
+
+
+def percentile(values: list[float], q: float) -> float:
+    return statistics.quantiles(values, n=1000)[int(q * 10) - 1] if len(values) > 1 else values[0]
+
+
+async def run(n_accounts: int, n_devices: int, rate: float, duration: float) -> None:
+    parent, child = multiprocessing.Pipe()
+    process = multiprocessing.Process(
+        target=_standins_main, args=(child, n_accounts, n_devices), daemon=True
+    )
+    process.start()
+    loop = asyncio.get_running_loop()
+    base_url, mqtt_port = await loop.run_in_executor(None, parent.recv)
+
+    sink = Sink()
+    clients, tasks = [], []
+    for username in accounts_for(n_accounts, n_devices):
+        client = RinnaiClient(
+            username,
+            PASSWORD,
+            api_base_url=base_url,
+            mqtt_host="127.0.0.1",
+            mqtt_port=mqtt_port,
+            mqtt_tls=False,
+        )
+        devices = await client.get_devices()
+        tasks.append(asyncio.create_task(client.run()))
+        for device_id in devices:
+            await client.subscribe(device_id, sink.on_update)
+        clients.append(client)
+
+    expected_subscriptions = n_accounts * n_devices
+    while True:
+        parent.send(("subscriptions",))
+        if await loop.run_in_executor(None, parent.recv) >= expected_subscriptions:
+            break
+        await asyncio.sleep(0.1)
+
+    cpu_start, wall_start = time.process_time(), time.monotonic()
+    parent.send(("emit", rate, duration))
+    sent = await loop.run_in_executor(None, parent.recv)
+    deadline = time.monotonic() + 10
+    while len(sink.latencies_ns) < sent and time.monotonic() < deadline:
+        await asyncio.sleep(0.05)
+    cpu, wall = time.process_time() - cpu_start, time.monotonic() - wall_start
+
+    parent.send(("stop",))
+    for task in tasks:
+        task.cancel()
+    for client in clients:
+        await client.close()
+    process.join(5)
+
+    received = len(sink.latencies_ns)
+    latencies_ms = [value / 1e6 for value in sink.latencies_ns]
+    peak_kib = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    print(f"{n_accounts} accounts x {n_devices} devices, {rate:g} frames/s per device, {duration:g} s")
+    print(f"frames sent {sent}, received {received} ({received / max(sent, 1):.1%})")
+    print(f"throughput  {received / wall:10.0f} msg/s")
+    print(f"cpu/message {cpu / max(received, 1) * 1e6:10.1f} us")
+    if latencies_ms:
+        print(
+            "latency ms  p50 %.2f  p90 %.2f  p99 %.2f  max %.2f"
+            % (
+                percentile(latencies_ms, 50),
+                percentile(latencies_ms, 90),
+                percentile(latencies_ms, 99),
+                max(latencies_ms),
+            )
+        )
+    print(f"peak rss    {peak_kib / 1024:10.1f} MiB")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--accounts", type=int, default=2)
+    parser.add_argument("--devices", type=int, default=4)
+    parser.add_argument("--rate", type=float, default=10, help="frames per second per device")
+    parser.add_argument("--duration", type=float, default=5, help="seconds")
+    args = parser.parse_args()
+    asyncio.run(run(args.accounts, args.devices, args.rate, args.duration))
+
+
+if __name__ == "__main__":
+    main()
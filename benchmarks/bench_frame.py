@@ -0,0 +1,46 @@
+"""Compare frame.decode_frame with the decode path it replaced.
+
+Run from the repository root: python -m benchmarks.bench_frame
+"""
+
+import json
+import re
+import timeit
+
+from . import _bootstrap  # noqa: F401
+from .frames import RECORDED
+
+from rinnai_smart import frame
+
+
+def legacy_decode(payload: bytes) -> dict | None:
+    """The original _on_message path: str decode, regex, json, then ptn check."""
+    payload_str = payload.decode("utf-8")
+    payload_str = re.sub(r',\s*([}\]])', r'\1', payload_str)
+    data = json.loads(payload_str)
+    if data.get("ptn", "") != "J00":
+        return None
+    info = {}
+    for item in data.get("enl", ()):
+        if "id" in item and "data" in item:
+            info[item["id"]] = item["data"]
+    return info
+
+
+def main(number: int = 20000) -> None:
+    for payload in RECORDED:
+        assert frame.decode_frame(payload) == legacy_decode(payload), payload
+
+    backend = "orjson" if frame.orjson is not None else "json"
+    print(f"decode_frame backend: {backend}, {number} iterations per frame")
+    for payload in RECORDED:
+        legacy = min(timeit.repeat(lambda: legacy_decode(payload), number=number, repeat=3))
+        fast = min(timeit.repeat(lambda: frame.decode_frame(payload), number=number, repeat=3))
+        print(
+            f"{len(payload):5d} bytes  legacy {legacy / number * 1e6:7.2f} us"
+            f"  decode_frame {fast / number * 1e6:7.2f} us  x{legacy / fast:5.1f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,140 @@
+"""Replay a frame recording through RinnaiClient._on_message.
+
+Recordings come from the integration's record_frames service (see
+capture.FrameRecorder). Each redacted MAC in the recording becomes a device,
+so routing, deduplication, decoding, change detection and dispatch all run as
+they do live. --speed 1 replays in real time, 10 ten times faster, and 0 (the
+default) as fast as possible; throughput and per-stage timings are printed.
+
+Run from the repository root:
+    python -m benchmarks.bench_replay /config/rinnai_frames_<entry id>.bin --speed 0
+"""
+
+import argparse
+import asyncio
+import time
+
+from . import _bootstrap  # noqa: F401
+
+from rinnai_smart import rinnai_client
+from rinnai_smart.capture import read_recording
+from rinnai_smart.rinnai_client import RinnaiClient
+
+
+class StageTimer:
+    """Accumulate wall time spent in a wrapped callable."""
+
+    def __init__(self):
+        self.calls = 0
+        self.seconds = 0.0
+
+    def wrap(self, func):
+        def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                self.seconds += time.perf_counter() - start
+                self.calls += 1
+
+        return wrapper
+
+    def wrap_async(self, func):
+        async def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return await func(*args, **kwargs)
+            finally:
+                self.seconds += time.perf_counter() - start
+                self.calls += 1
+
+        return wrapper
+
+
+def _mac(topic: str) -> str | None:
+    tokens = topic.split("/")
+    return tokens[4] if len(tokens) > 4 else None
+
+
+async def replay(path: str, speed: float = 0.0, duplicate_window: float = 30.0) -> None:
+    records = list(read_recording(path))
+    if not records:
+        raise SystemExit(f"No frames in {path}")
+    macs = sorted({mac for _, topic, _ in records if (mac := _mac(topic))})
+
+    client = RinnaiClient("replay", "replay", duplicate_window=duplicate_window)
+    client.load_snapshot(
+        {mac: {"device": {"id": mac, "mac": mac, "deviceType": "replay"}, "info": {}} for mac in macs}
+    )
+
+    stages = {name: StageTimer() for name in ("dedup", "decode", "apply", "dispatch")}
+    updates = 0
+
+    async def on_update(info, changed):
+        nonlocal updates
+        updates += 1
+
+    dispatch = stages["dispatch"].wrap_async(on_update)
+    for mac in macs:
+        client._subscribes[mac] = (dispatch, mac)
+    client.dedup.is_duplicate = stages["dedup"].wrap(client.dedup.is_duplicate)
+    decode = rinnai_client.decode_frame
+    rinnai_client.decode_frame = stages["decode"].wrap(decode)
+    client._apply_fields = stages["apply"].wrap_async(client._apply_fields)
+
+    total = StageTimer()
+    on_message = total.wrap_async(client._on_message)
+    first = records[0][0]
+    started = time.perf_counter()
+    lag = 0.0
+    try:
+        for timestamp, topic, payload in records:
+            if speed > 0:
+                due = started + (timestamp - first) / speed
+                delay = due - time.perf_counter()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+                else:
+                    lag = max(lag, -delay)
+            await on_message(topic, payload)
+    finally:
+        rinnai_client.decode_frame = decode
+    elapsed = time.perf_counter() - started
+    await client.close()
+
+    print(f"{len(records)} frames from {len(macs)} devices, recorded over {records[-1][0] - first:.1f} s")
+    print(
+        f"replayed in {elapsed:.3f} s ({len(records) / elapsed:,.0f} frames/s), "
+        f"{updates} updates, {client.dedup.hits} duplicates, "
+        f"{client.metrics.counter('parse_failures').value} parse failures"
+    )
+    if speed > 0:
+        print(f"max lag behind schedule: {lag * 1000:.2f} ms")
+    # apply includes dispatch; routing is whatever _on_message spends outside the other stages.
+    own = {
+        "route": total.seconds - stages["dedup"].seconds - stages["decode"].seconds - stages["apply"].seconds,
+        "dedup": stages["dedup"].seconds,
+        "decode": stages["decode"].seconds,
+        "apply": stages["apply"].seconds - stages["dispatch"].seconds,
+        "dispatch": stages["dispatch"].seconds,
+    }
+    print(f"{'stage':10s} {'calls':>8s} {'total ms':>10s} {'us/frame':>10s}")
+    for name, seconds in own.items():
+        calls = stages[name].calls if name in stages else total.calls
+        print(f"{name:10s} {calls:8d} {seconds * 1000:10.2f} {seconds / total.calls * 1e6:10.2f}")
+    print(f"{'total':10s} {total.calls:8d} {total.seconds * 1000:10.2f} {total.seconds / total.calls * 1e6:10.2f}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("path")
+    parser.add_argument(
+        "--speed", type=float, default=0.0, help="time scale; 1 is real time, 0 as fast as possible"
+    )
+    parser.add_argument("--duplicate-window", type=float, default=30.0)
+    args = parser.parse_args()
+    asyncio.run(replay(args.path, args.speed, args.duplicate_window))
+
+
+if __name__ == "__main__":
+    main()
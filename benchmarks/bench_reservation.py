@@ -0,0 +1,65 @@
+"""Round-trip checks and timings for the cycle reservation codec.
+
+Run from the repository root: python -m benchmarks.bench_reservation
+"""
+
+import random
+import timeit
+
+from . import _bootstrap  # noqa: F401
+
+from rinnai_smart import reservation
+
+
+def legacy_decode(data: str) -> str:
+    """The bit loop device.py used to (try to) run for every read."""
+    hours = []
+    hour = 0
+    for hex_str in data.split():
+        hex_value = int(hex_str, 16)
+        for i in range(8):
+            if hex_value & (1 << i):
+                hours.append(str(hour))
+            hour += 1
+    return ",".join(hours)
+
+
+def check_round_trips(samples: int = 20000, seed: int = 0) -> None:
+    rng = random.Random(seed)
+    masks = [0, (1 << 24) - 1] + [1 << hour for hour in range(24)]
+    masks += [rng.getrandbits(24) for _ in range(samples)]
+    for mask in masks:
+        hours = tuple(hour for hour in range(24) if mask >> hour & 1)
+        data = reservation.encode(hours)
+        assert reservation.decode(data) == hours, (mask, data)
+        assert reservation.decode(data.lower()) == hours, (mask, data)
+        text = reservation.format_hours(hours)
+        assert reservation.parse(text) == hours, (mask, text)
+        assert reservation.encode(reservation.parse(text)) == data, (mask, text)
+        assert legacy_decode(data) == ",".join(map(str, hours)), (mask, data)
+    for bad in ("24", "8-6", "-1", "3-24"):
+        try:
+            reservation.parse(bad)
+        except ValueError:
+            continue
+        raise AssertionError(f"accepted {bad!r}")
+    print(f"round trips ok for {len(masks)} masks")
+
+
+def main(number: int = 100000) -> None:
+    check_round_trips()
+    data = "C0 00 7C"
+    text = "6-7,18-22"
+    timings = {
+        "legacy decode": lambda: legacy_decode(data),
+        "decode": lambda: reservation.decode(data),
+        "decode+format": lambda: reservation.format_hours(reservation.decode(data)),
+        "parse+encode": lambda: reservation.encode(reservation.parse(text)),
+    }
+    for name, func in timings.items():
+        best = min(timeit.repeat(func, number=number, repeat=3))
+        print(f"{name:14s} {best / number * 1e6:6.2f} us")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,30 @@
+"""Frames recorded from a RUS-R16E86FBF, with identifiers replaced."""
+
+RES_FRAME = (
+    b'{"ptn":"J00","code":"FFFF", "id":"0F060G55","sum":"16", "enl":[ '
+    b'{"id":"errorCode","data":"0"}, {"id":"burningState","data":"1"}, '
+    b'{"id":"operationMode","data":"C2"}, {"id":"hotWaterTempSetting","data":"20"}, '
+    b'{"id":"bathWaterInjectionSetting","data":"0096"}, {"id":"waterInjectionStatus","data":"0"}, '
+    b'{"id":"remainingWater","data":"0096"}, {"id":"faucetNotCloseSign","data":"1"}, '
+    b'{"id":"hotWaterUseableSign","data":"0"}, {"id":"cycleModeSetting","data":"2"}, '
+    b'{"id":"cycleReservationTimeSetting","data":"00 00 00"}, '
+    b'{"id":"temporaryCycleInsulationSetting","data":"1"}, {"id":"cycleReservationSetting","data":"1"}, '
+    b'{"id":"waterInjectionCompleteConfirm","data":"0"}, {"id":"childLock","data":"0"}, '
+    b'{"id":"priority","data":"1"} ],"It":"1718000000"}'
+)
+
+# Same frame as the firmware sometimes sends it, with trailing commas.
+RES_FRAME_TRAILING_COMMA = RES_FRAME.replace(b'"priority","data":"1"}', b'"priority","data":"1",},')
+
+SHORT_FRAME = (
+    b'{"ptn":"J00","code":"FFFF","id":"0F060G55","sum":"1",'
+    b'"enl":[{"id":"burningState","data":"0"}],"It":"1718000001"}'
+)
+
+# Frames with a different ptn are ignored by the integration.
+OTHER_FRAME = (
+    b'{"ptn":"J05","code":"FFFF","id":"0F060G55","sum":"2",'
+    b'"enl":[{"id":"gasUsed","data":"0012"},{"id":"waterUsed","data":"0040"}],"It":"1718000002"}'
+)
+
+RECORDED = [RES_FRAME, SHORT_FRAME, RES_FRAME_TRAILING_COMMA, OTHER_FRAME]
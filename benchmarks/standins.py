@@ -0,0 +1,223 @@
+"""Local stand-ins for iot.rinnai.com.cn and mqtt.rinnai.com.cn.
+
+FakeRinnaiAPI serves the three HTTP endpoints the client uses. FakeBroker is a
+minimal MQTT 3.1.1 broker: CONNECT, SUBSCRIBE, UNSUBSCRIBE, PUBLISH (QoS 0/1
+in, QoS 0 out), PINGREQ and DISCONNECT, which is all aiomqtt needs here.
+"""
+
+import asyncio
+import struct
+
+from aiohttp import web
+
+
+def make_device(account: int, index: int) -> dict:
+    mac = "%04X%08X" % (account, index)
+    return {
+        "id": f"dev-{account}-{index}",
+        "mac": mac,
+        "name": "RUS-R**E86系列",
+        "authCode": "AC%010d" % (account * 100000 + index),
+        "deviceType": "0F060G55",
+        "online": "1",
+    }
+
+
+DEVICE_INFO = {
+    "bathWaterInjectionSetting": "0096",
+    "burningState": "0",
+    "childLock": "0",
+    "cycleModeSetting": "2",
+    "cycleReservationSetting": "1",
+    "cycleReservationTimeSetting": "00 00 00",
+    "errorCode": "0",
+    "faucetNotCloseSign": "1",
+    "hotWaterTempSetting": "26",
+    "hotWaterUseableSign": "0",
+    "operationMode": "C2",
+    "priority": "1",
+    "remainingWater": "0096",
+    "temporaryCycleInsulationSetting": "1",
+    "waterInjectionCompleteConfirm": "0",
+    "waterInjectionStatus": "0",
+}
+
+
+class FakeRinnaiAPI:
+    def __init__(self, accounts: dict[str, list[dict]]):
+        self._accounts = accounts
+        self._devices = {
+            device["id"]: device for devices in accounts.values() for device in devices
+        }
+        self._runner: web.AppRunner | None = None
+        self.port = 0
+
+    async def start(self, host: str = "127.0.0.1") -> str:
+        app = web.Application()
+        app.router.add_get("/app/V1/login", self._login)
+        app.router.add_get("/app/V1/device/list", self._device_list)
+        app.router.add_get("/app/V1/device/processParameter", self._process_parameter)
+        self._runner = web.AppRunner(app, access_log=None)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, host, 0)
+        await site.start()
+        self.port = site._server.sockets[0].getsockname()[1]
+        return f"http://{host}:{self.port}"
+
+    async def stop(self) -> None:
+        if self._runner is not None:
+            await self._runner.cleanup()
+
+    def _username(self, request: web.Request) -> str | None:
+        token = request.headers.get("Authorization", "").removeprefix("Bearer ")
+        username = token.removeprefix("token-")
+        return username if username in self._accounts else None
+
+    async def _login(self, request: web.Request) -> web.Response:
+        username = request.query.get("username")
+        if username not in self._accounts:
+            return web.json_response({"success": False, "message": "unknown user"})
+        return web.json_response({"success": True, "data": {"token": f"token-{username}"}})
+
+    async def _device_list(self, request: web.Request) -> web.Response:
+        username = self._username(request)
+        if username is None:
+            return web.json_response({"success": False, "code": "401", "message": "invalid token"})
+        return web.json_response(
+            {"success": True, "data": {"list": self._accounts[username]}}
+        )
+
+    async def _process_parameter(self, request: web.Request) -> web.Response:
+        if self._username(request) is None:
+            return web.json_response({"success": False, "code": "401", "message": "invalid token"})
+        if request.query.get("deviceId") not in self._devices:
+            return web.json_response({"success": False, "message": "unknown device"})
+        return web.json_response({"success": True, "data": dict(DEVICE_INFO)})
+
+
+def _encode_length(length: int) -> bytes:
+    out = bytearray()
+    while True:
+        byte, length = length % 128, length // 128
+        out.append(byte | 0x80 if length else byte)
+        if not length:
+            return bytes(out)
+
+
+def _utf8(data: bytes, offset: int) -> tuple[str, int]:
+    (length,) = struct.unpack_from("!H", data, offset)
+    offset += 2
+    return data[offset:offset + length].decode("utf-8"), offset + length
+
+
+def topic_matches(topic_filter: str, topic: str) -> bool:
+    filter_levels = topic_filter.split("/")
+    topic_levels = topic.split("/")
+    for i, level in enumerate(filter_levels):
+        if level == "#":
+            return True
+        if i >= len(topic_levels):
+            return False
+        if level != "+" and level != topic_levels[i]:
+            return False
+    return len(filter_levels) == len(topic_levels)
+
+
+class _Session:
+    def __init__(self, writer: asyncio.StreamWriter):
+        self.writer = writer
+        self.filters: set[str] = set()
+
+
+class FakeBroker:
+    def __init__(self):
+        self._server: asyncio.Server | None = None
+        self._sessions: set[_Session] = set()
+        self.port = 0
+        self.published = 0
+
+    @property
+    def subscription_count(self) -> int:
+        return sum(len(session.filters) for session in self._sessions)
+
+    async def start(self, host: str = "127.0.0.1") -> int:
+        self._server = await asyncio.start_server(self._handle, host, 0)
+        self.port = self._server.sockets[0].getsockname()[1]
+        return self.port
+
+    async def stop(self) -> None:
+        for session in list(self._sessions):
+            session.writer.close()
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+
+    def publish(self, topic: str, payload: bytes) -> None:
+        """Deliver a message to every session subscribed to topic (QoS 0)."""
+        encoded = topic.encode("utf-8")
+        body = struct.pack("!H", len(encoded)) + encoded + payload
+        packet = b"\x30" + _encode_length(len(body)) + body
+        for session in self._sessions:
+            if any(topic_matches(f, topic) for f in session.filters):
+                session.writer.write(packet)
+        self.published += 1
+
+    async def drain(self) -> None:
+        for session in list(self._sessions):
+            try:
+                await session.writer.drain()
+            except ConnectionError:
+                pass
+
+    async def _read_packet(self, reader: asyncio.StreamReader) -> tuple[int, bytes]:
+        header = (await reader.readexactly(1))[0]
+        length, multiplier = 0, 1
+        while True:
+            byte = (await reader.readexactly(1))[0]
+            length += (byte & 0x7F) * multiplier
+            if not byte & 0x80:
+                break
+            multiplier *= 128
+        return header, await reader.readexactly(length)
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        session = _Session(writer)
+        try:
+            header, _ = await self._read_packet(reader)
+            if header >> 4 != 1:
+                return
+            writer.write(b"\x20\x02\x00\x00")
+            self._sessions.add(session)
+            while True:
+                header, body = await self._read_packet(reader)
+                kind = header >> 4
+                if kind == 3:
+                    topic, offset = _utf8(body, 0)
+                    qos = (header >> 1) & 0x03
+                    if qos:
+                        writer.write(b"\x40\x02" + body[offset:offset + 2])
+                        offset += 2
+                    self.publish(topic, body[offset:])
+                elif kind == 8:
+                    packet_id, offset, granted = body[:2], 2, bytearray()
+                    while offset < len(body):
+                        topic_filter, offset = _utf8(body, offset)
+                        offset += 1
+                        session.filters.add(topic_filter)
+                        granted.append(0)
+                    writer.write(b"\x90" + _encode_length(2 + len(granted)) + packet_id + granted)
+                elif kind == 10:
+                    packet_id, offset = body[:2], 2
+                    while offset < len(body):
+                        topic_filter, offset = _utf8(body, offset)
+                        session.filters.discard(topic_filter)
+                    writer.write(b"\xb0\x02" + packet_id)
+                elif kind == 12:
+                    writer.write(b"\xd0\x00")
+                elif kind == 14:
+                    return
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            self._sessions.discard(session)
+            writer.close()
@@ -2,25 +2,49 @@
 
 from __future__ import annotations
 import asyncio
+import time
+
+import voluptuous as vol
 
 from homeassistant.config_entries import ConfigEntry
-from homeassistant.core import HomeAssistant
+from homeassistant.core import Event, HomeAssistant, ServiceCall, callback
+from homeassistant.exceptions import ConfigEntryNotReady
+from homeassistant.helpers import config_validation as cv
+from homeassistant.helpers import device_registry as dr
+from homeassistant.helpers.aiohttp_client import async_get_clientsession
+from homeassistant.helpers.storage import Store
 from homeassistant.util import ssl as ssl_util
 from homeassistant.const import (
     CONF_PASSWORD, 
+    CONF_TOKEN,
     CONF_USERNAME,
+    EVENT_HOMEASSISTANT_STOP,
     MAJOR_VERSION,
     MINOR_VERSION,
 )
 
+from .admission import AdmissionController
 from .const import (
     DOMAIN,
-    CLIENT
+    ADMISSION,
+    CLIENT,
+    CLIENT_TASK,
+    CONF_SHARED_SESSION,
+    ATTR_ENABLED,
+    LOGGER,
+    SERVICE_RECORD_FRAMES,
+    SERVICE_SET_FRAME_TRACE,
+    SNAPSHOT_SAVE_DELAY,
+    STORAGE_VERSION,
 )
 from .device import RinnaiDeviceDataUpdateCoordinator
 from .rinnai_client import RinnaiClient
 
-PLATFORMS = ["water_heater", "text", "select", "switch", "binary_sensor"]
+PLATFORMS = ["water_heater", "text", "select", "switch", "binary_sensor", "sensor"]
+
+CONFIG_SCHEMA = cv.config_entry_only_config_schema(DOMAIN)
+
+SET_FRAME_TRACE_SCHEMA = vol.Schema({vol.Required(ATTR_ENABLED): cv.boolean})
 
 
 def is_min_ha_version(min_ha_major_ver: int, min_ha_minor_ver: int) -> bool:
@@ -30,23 +54,125 @@ def is_min_ha_version(min_ha_major_ver: int, min_ha_minor_ver: int) -> bool:
         (MAJOR_VERSION == min_ha_major_ver and MINOR_VERSION >= min_ha_minor_ver)
     )
 
+def _entries_data(hass: HomeAssistant) -> dict[str, dict]:
+    """Return the per-entry data, leaving out domain-wide keys such as ADMISSION."""
+    return {
+        entry_id: data
+        for entry_id, data in hass.data.get(DOMAIN, {}).items()
+        if isinstance(data, dict) and CLIENT in data
+    }
+
+async def async_setup(hass: HomeAssistant, config: dict) -> bool:
+    """Set up the rinnai_smart services."""
+    # Spreads the logins and connects of all entries over time.
+    hass.data.setdefault(DOMAIN, {})[ADMISSION] = AdmissionController()
+
+    async def _async_set_frame_trace(call: ServiceCall) -> None:
+        for data in _entries_data(hass).values():
+            data[CLIENT].frame_trace = call.data[ATTR_ENABLED]
+
+    async def _async_record_frames(call: ServiceCall) -> None:
+        for entry_id, data in _entries_data(hass).items():
+            if call.data[ATTR_ENABLED]:
+                data[CLIENT].start_recording(hass.config.path(f"{DOMAIN}_frames_{entry_id}.bin"))
+            else:
+                await data[CLIENT].stop_recording()
+
+    hass.services.async_register(
+        DOMAIN, SERVICE_SET_FRAME_TRACE, _async_set_frame_trace, schema=SET_FRAME_TRACE_SCHEMA
+    )
+    hass.services.async_register(
+        DOMAIN, SERVICE_RECORD_FRAMES, _async_record_frames, schema=SET_FRAME_TRACE_SCHEMA
+    )
+    return True
+
 async def async_setup_entry(hass: HomeAssistant, entry: ConfigEntry) -> bool:
     """Set up rinnai_smart from a config entry."""
 
     hass.data.setdefault(DOMAIN, {})
     hass.data[DOMAIN][entry.entry_id] = {}
 
-    hass.data[DOMAIN][entry.entry_id][CLIENT] = client = RinnaiClient(entry.data[CONF_USERNAME], entry.data[CONF_PASSWORD])
-    devices = await client.get_devices()
-    hass.loop.create_task(client.run(ssl_util.client_context()))
+    store = Store(hass, STORAGE_VERSION, f"{DOMAIN}.{entry.entry_id}")
 
-    hass.data[DOMAIN][entry.entry_id]["devices"] = devices = [
-        RinnaiDeviceDataUpdateCoordinator(hass, client, value["device"], entry.options)
-        for value in devices.values()
-    ]
-    for device in devices:
-        # await device.async_config_entry_first_refresh() # FIXME: _async_setup is not invoked in docker HA 2024.6.3
-        await device._async_setup()
+    save_pending = False
+
+    def _snapshot() -> dict:
+        nonlocal save_pending
+        save_pending = False
+        now = time.time()
+        usage = {}
+        for device in devices:
+            # Credit a burn that is still going up to now.
+            device.usage.advance(now)
+            usage[device.id] = device.usage.as_dict()
+        return {"devices": client.devices, "usage": usage}
+
+    def _save_snapshot() -> None:
+        # async_delay_save restarts its timer on every call, so a device that
+        # changes more often than the delay would keep pushing the save out.
+        nonlocal save_pending
+        if not save_pending:
+            save_pending = True
+            store.async_delay_save(_snapshot, SNAPSHOT_SAVE_DELAY)
+
+    def _save_token(token: dict) -> None:
+        # Keeps the token across restarts; a restart then needs no login.
+        hass.config_entries.async_update_entry(entry, data={**entry.data, CONF_TOKEN: token})
+
+    # Reuse Home Assistant's shared session when asked to, otherwise the
+    # client owns a pooled session that lives as long as this entry.
+    session = async_get_clientsession(hass) if entry.options.get(CONF_SHARED_SESSION) else None
+    hass.data[DOMAIN][entry.entry_id][CLIENT] = client = RinnaiClient(
+        entry.data[CONF_USERNAME],
+        entry.data[CONF_PASSWORD],
+        session,
+        _save_snapshot,
+        token=entry.data.get(CONF_TOKEN),
+        on_token=_save_token,
+        admission=hass.data[DOMAIN].get(ADMISSION),
+        instance_id=entry.entry_id,
+    )
+    hass.data[DOMAIN][entry.entry_id]["options"] = dict(entry.options)
+    hass.data[DOMAIN][entry.entry_id][CLIENT_TASK] = hass.loop.create_task(
+        client.run(ssl_util.client_context())
+    )
+    hass.data[DOMAIN][entry.entry_id]["devices"] = devices = []
+    hass.data[DOMAIN][entry.entry_id]["store"] = store
+    hass.data[DOMAIN][entry.entry_id]["snapshot"] = _snapshot
+
+    snapshot = await store.async_load()
+    usage = (snapshot or {}).get("usage", {})
+    if snapshot and snapshot.get("devices"):
+        # Start from the last known state and reconcile with the cloud later.
+        client.load_snapshot(snapshot["devices"])
+        for value in client.devices.values():
+            device = RinnaiDeviceDataUpdateCoordinator(hass, client, value["device"], entry.options)
+            device.usage.restore(usage.get(device.id))
+            devices.append(device)
+            await device._async_setup(flush=False)
+        # One SUBSCRIBE for all devices instead of one per device.
+        await client.flush_subscriptions()
+        entry.async_on_unload(
+            hass.loop.create_task(_async_reconcile(hass, entry, client, devices)).cancel
+        )
+    else:
+        # Coordinators are created as soon as each device has loaded, so the
+        # ready ones start subscribing while slower devices are still fetching.
+        try:
+            async for _, value in client.iter_devices():
+                device = RinnaiDeviceDataUpdateCoordinator(hass, client, value["device"], entry.options)
+                device.usage.restore(usage.get(device.id))
+                devices.append(device)
+                # await device.async_config_entry_first_refresh() # FIXME: _async_setup is not invoked in docker HA 2024.6.3
+                await device._async_setup(flush=False)
+            await client.flush_subscriptions()
+        except Exception as e:
+            hass.data[DOMAIN].pop(entry.entry_id)[CLIENT_TASK].cancel()
+            for device in devices:
+                await device.async_shutdown()
+            await client.close()
+            # Home Assistant retries the setup later, e.g. once the cloud is back.
+            raise ConfigEntryNotReady(f"Failed to load devices: {e}") from e
 
     if is_min_ha_version(2022,8):
         await hass.config_entries.async_forward_entry_setups(entry, PLATFORMS)
@@ -54,13 +180,59 @@ async def async_setup_entry(hass: HomeAssistant, entry: ConfigEntry) -> bool:
         hass.config_entries.async_setup_platforms(entry, PLATFORMS)
 
     entry.async_on_unload(entry.add_update_listener(_async_options_updated))
+    @callback
+    def _async_on_stop(event: Event) -> None:
+        # Make sure a save is pending when Home Assistant stops, so the
+        # Store's final write keeps usage that has not been exported yet.
+        _save_snapshot()
+
+    entry.async_on_unload(hass.bus.async_listen_once(EVENT_HOMEASSISTANT_STOP, _async_on_stop))
     
     return True
 
+async def _async_reconcile(
+    hass: HomeAssistant,
+    entry: ConfigEntry,
+    client: RinnaiClient,
+    devices: list[RinnaiDeviceDataUpdateCoordinator],
+) -> None:
+    """Refresh a snapshot-started entry from the cloud, pushing only deltas."""
+    known = {device.id for device in devices}
+    try:
+        await client.get_devices()
+    except Exception as e:
+        LOGGER.warning(f"Failed to refresh devices from the cloud, using cached state: {e}")
+        return
+    removed = known - set(client.devices)
+    if removed:
+        # Removed or unshared heaters take their entities with them.
+        registry = dr.async_get(hass)
+        for device_id in removed:
+            device_entry = registry.async_get_device(identifiers={(DOMAIN, device_id)})
+            if device_entry is not None:
+                registry.async_update_device(device_entry.id, remove_config_entry_id=entry.entry_id)
+    if set(client.devices) != known:
+        # Entities are created and dropped per device only by a reload.
+        hass.config_entries.async_schedule_reload(entry.entry_id)
+
 async def _async_options_updated(hass: HomeAssistant, entry: ConfigEntry):
     """Update options."""
+    # Token updates also land here; only option changes need a reload.
+    if hass.data[DOMAIN].get(entry.entry_id, {}).get("options") == dict(entry.options):
+        return
     await hass.config_entries.async_reload(entry.entry_id)
 
 async def async_unload_entry(hass: HomeAssistant, entry: ConfigEntry) -> bool:
     """Unload a config entry."""
-    return await hass.config_entries.async_unload_platforms(entry, PLATFORMS)
+    unload_ok = await hass.config_entries.async_unload_platforms(entry, PLATFORMS)
+    if unload_ok:
+        data = hass.data[DOMAIN].pop(entry.entry_id)
+        task = data.get(CLIENT_TASK)
+        if task is not None:
+            task.cancel()
+        for device in data.get("devices", []):
+            await device.async_shutdown()
+        # Reloads (e.g. after an options change) must not lose usage either.
+        await data["store"].async_save(data["snapshot"]())
+        await data[CLIENT].close()
+    return unload_ok
@@ -0,0 +1,69 @@
+"""Admission control for cloud logins and MQTT connects.
+
+All accounts of a process share one controller, so after a restart or a cloud
+outage their logins and connects are spread over jittered slots instead of
+hitting the servers at the same moment.
+"""
+
+import asyncio
+import random
+import time
+from contextlib import asynccontextmanager
+
+ADMISSION_INTERVAL = 1.0
+ADMISSION_JITTER = 1.0
+ADMISSION_MAX_IN_FLIGHT = 4
+
+
+class AdmissionController:
+    """Hand out start slots at most one per `interval` seconds, plus jitter.
+
+    At most `max_in_flight` admitted operations run at once. queued and
+    in_flight count the operations waiting for and holding a slot, by kind.
+    """
+
+    def __init__(
+        self,
+        interval: float = ADMISSION_INTERVAL,
+        jitter: float = ADMISSION_JITTER,
+        max_in_flight: int = ADMISSION_MAX_IN_FLIGHT,
+    ):
+        self.interval = interval
+        self.jitter = jitter
+        self._semaphore = asyncio.Semaphore(max_in_flight)
+        self._next_slot = 0.0
+        self.queued: dict[str, int] = {}
+        self.in_flight: dict[str, int] = {}
+        self.admitted: dict[str, int] = {}
+
+    @property
+    def total_queued(self) -> int:
+        return sum(self.queued.values())
+
+    @property
+    def total_in_flight(self) -> int:
+        return sum(self.in_flight.values())
+
+    def _reserve(self) -> float:
+        """Reserve the next free slot and return the delay until it starts."""
+        now = time.monotonic()
+        start = max(now, self._next_slot)
+        self._next_slot = start + self.interval
+        return start - now + random.uniform(0, self.jitter)
+
+    @asynccontextmanager
+    async def admit(self, kind: str):
+        """Wait for a slot for one `kind` operation, e.g. "login" or "connect"."""
+        self.queued[kind] = self.queued.get(kind, 0) + 1
+        try:
+            await asyncio.sleep(self._reserve())
+            await self._semaphore.acquire()
+        finally:
+            self.queued[kind] -= 1
+        self.in_flight[kind] = self.in_flight.get(kind, 0) + 1
+        self.admitted[kind] = self.admitted.get(kind, 0) + 1
+        try:
+            yield
+        finally:
+            self.in_flight[kind] -= 1
+            self._semaphore.release()
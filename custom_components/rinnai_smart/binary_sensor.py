@@ -22,7 +22,9 @@ class RinnaiBinarySensor(RinnaiEntity, BinarySensorEntity):
         if sensor_dict.get("icon"):
             self._attr_icon = sensor_dict["icon"]
         self._sensor_dict = sensor_dict
-        super().__init__(sensor_dict["entity_type"], sensor_dict["name"], device)
+        super().__init__(
+            sensor_dict["entity_type"], sensor_dict["name"], device, sensor_dict.get("fields")
+        )
 
     @property
     def is_on(self):
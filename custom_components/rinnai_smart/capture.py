@@ -0,0 +1,110 @@
+"""Record inbound MQTT frames to disk and read them back for replay.
+
+A recording is a sequence of records, each a little-endian header
+(timestamp: float64, topic length: uint16, payload length: uint32) followed
+by the topic and the raw payload. MACs in topics are replaced by stable
+pseudonyms and auth codes in payloads are blanked before anything is written.
+Files rotate to `<path>.1`, `<path>.2`, ... once they exceed `max_bytes`.
+"""
+
+import hashlib
+import os
+import re
+import secrets
+import struct
+import time
+
+HEADER = struct.Struct("<dHI")
+FLUSH_EVERY = 64
+
+_MAC_IN_TOPIC = re.compile(r"^(rinnai/SR/01/SR/)([^/]+)(/.*)$")
+_AUTH_CODE = re.compile(rb'("code"\s*:\s*")[^"]*(")')
+
+
+class FrameRecorder:
+    """Buffer frames in memory and append them to a rotating file.
+
+    append() only touches memory; flush() does the file I/O and should run in
+    an executor when called from the event loop.
+    """
+
+    def __init__(self, path: str, max_bytes: int = 16 * 1024 * 1024, backups: int = 3):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.backups = backups
+        self._salt = secrets.token_bytes(16)
+        self._pseudonyms: dict[str, str] = {}
+        self._buffer: list[bytes] = []
+
+    def _pseudonym(self, mac: str) -> str:
+        pseudonym = self._pseudonyms.get(mac)
+        if pseudonym is None:
+            digest = hashlib.blake2s(mac.encode(), key=self._salt, digest_size=6)
+            pseudonym = self._pseudonyms[mac] = digest.hexdigest().upper()
+        return pseudonym
+
+    def redact(self, topic: str, payload: bytes) -> tuple[str, bytes]:
+        match = _MAC_IN_TOPIC.match(topic)
+        if match:
+            topic = match.group(1) + self._pseudonym(match.group(2)) + match.group(3)
+        return topic, _AUTH_CODE.sub(rb"\1REDACTED\2", payload)
+
+    def append(self, topic: str, payload: bytes, timestamp: float | None = None) -> bool:
+        """Buffer one frame; returns True once the buffer should be flushed."""
+        topic, payload = self.redact(topic, payload)
+        encoded = topic.encode("utf-8")
+        self._buffer.append(
+            HEADER.pack(time.time() if timestamp is None else timestamp, len(encoded), len(payload))
+            + encoded
+            + payload
+        )
+        return len(self._buffer) >= FLUSH_EVERY
+
+    def take(self) -> list[bytes]:
+        """Hand over the buffered records, e.g. to flush() them in an executor."""
+        records, self._buffer = self._buffer, []
+        return records
+
+    def flush(self, records: list[bytes] | None = None) -> None:
+        if records is None:
+            records = self.take()
+        if not records:
+            return
+        if os.path.exists(self.path) and os.path.getsize(self.path) >= self.max_bytes:
+            self._rotate()
+        with open(self.path, "ab") as file:
+            file.write(b"".join(records))
+
+    def _rotate(self) -> None:
+        for index in range(self.backups - 1, 0, -1):
+            source = f"{self.path}.{index}"
+            if os.path.exists(source):
+                os.replace(source, f"{self.path}.{index + 1}")
+        if self.backups:
+            os.replace(self.path, f"{self.path}.1")
+        else:
+            os.remove(self.path)
+
+
+def read_recording(path: str):
+    """Yield (timestamp, topic, payload) from a recording and its rotations, oldest first."""
+    index = 1
+    paths = []
+    while os.path.exists(f"{path}.{index}"):
+        paths.append(f"{path}.{index}")
+        index += 1
+    paths.reverse()
+    if os.path.exists(path):
+        paths.append(path)
+    for name in paths:
+        with open(name, "rb") as file:
+            data = file.read()
+        offset = 0
+        while offset + HEADER.size <= len(data):
+            timestamp, topic_length, payload_length = HEADER.unpack_from(data, offset)
+            offset += HEADER.size
+            topic = data[offset:offset + topic_length].decode("utf-8")
+            offset += topic_length
+            payload = data[offset:offset + payload_length]
+            offset += payload_length
+            yield timestamp, topic, payload
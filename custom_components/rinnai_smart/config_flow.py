@@ -7,11 +7,23 @@ from typing import Any
 
 import voluptuous as vol
 
-from homeassistant.config_entries import ConfigFlow, ConfigFlowResult
+from homeassistant.config_entries import ConfigEntry, ConfigFlow, ConfigFlowResult, OptionsFlow
 from homeassistant.const import CONF_PASSWORD, CONF_USERNAME
+from homeassistant.core import callback
 from homeassistant.exceptions import HomeAssistantError
 
-from .const import DOMAIN, TITLE, LOGGER
+from .const import (
+    CONF_DEBOUNCE,
+    CONF_MIN_WRITE_INTERVAL,
+    CONF_SETPOINT_STEP_INTERVAL,
+    CONF_SHARED_SESSION,
+    DEFAULT_DEBOUNCE,
+    DEFAULT_MIN_WRITE_INTERVAL,
+    DEFAULT_SETPOINT_STEP_INTERVAL,
+    DOMAIN,
+    TITLE,
+    LOGGER,
+)
 
 STEP_USER_DATA_SCHEMA = vol.Schema(
     {
@@ -26,6 +38,11 @@ class ConfigFlow(ConfigFlow, domain=DOMAIN):
 
     VERSION = 1
 
+    @staticmethod
+    @callback
+    def async_get_options_flow(config_entry: ConfigEntry) -> OptionsFlow:
+        return OptionsFlowHandler(config_entry)
+
     async def async_step_user(
         self, user_input: dict[str, Any] | None = None
     ) -> ConfigFlowResult:
@@ -35,3 +52,43 @@ class ConfigFlow(ConfigFlow, domain=DOMAIN):
         return self.async_show_form(
             step_id="user", data_schema=STEP_USER_DATA_SCHEMA
         )
+
+
+class OptionsFlowHandler(OptionsFlow):
+    """Handle rinnai_smart options."""
+
+    def __init__(self, config_entry: ConfigEntry) -> None:
+        # Kept under our own name: OptionsFlow.config_entry is only provided
+        # by Home Assistant 2024.11 and later.
+        self._config_entry = config_entry
+
+    async def async_step_init(
+        self, user_input: dict[str, Any] | None = None
+    ) -> ConfigFlowResult:
+        if user_input is not None:
+            return self.async_create_entry(data=user_input)
+
+        options = self._config_entry.options
+        return self.async_show_form(
+            step_id="init",
+            data_schema=vol.Schema(
+                {
+                    vol.Optional(
+                        CONF_SHARED_SESSION,
+                        default=options.get(CONF_SHARED_SESSION, False),
+                    ): bool,
+                    vol.Optional(
+                        CONF_SETPOINT_STEP_INTERVAL,
+                        default=options.get(CONF_SETPOINT_STEP_INTERVAL, DEFAULT_SETPOINT_STEP_INTERVAL),
+                    ): vol.All(vol.Coerce(float), vol.Range(min=0.1, max=5)),
+                    vol.Optional(
+                        CONF_MIN_WRITE_INTERVAL,
+                        default=options.get(CONF_MIN_WRITE_INTERVAL, DEFAULT_MIN_WRITE_INTERVAL),
+                    ): vol.All(vol.Coerce(float), vol.Range(min=0, max=300)),
+                    vol.Optional(
+                        CONF_DEBOUNCE,
+                        default=options.get(CONF_DEBOUNCE, DEFAULT_DEBOUNCE),
+                    ): vol.All(vol.Coerce(float), vol.Range(min=0, max=60)),
+                }
+            ),
+        )
@@ -7,6 +7,30 @@ LOGGER = logging.getLogger(__package__)
 
 DOMAIN = "rinnai"
 CLIENT = "client"
+CLIENT_TASK = "client_task"
+# Domain-wide AdmissionController, stored next to the per-entry data.
+ADMISSION = "admission"
+
+SERVICE_SET_FRAME_TRACE = "set_frame_trace"
+ATTR_ENABLED = "enabled"
+SERVICE_RECORD_FRAMES = "record_frames"
+
+STORAGE_VERSION = 1
+SNAPSHOT_SAVE_DELAY = 30
+# Minute past each hour at which the finished hour is pushed to long-term statistics.
+USAGE_EXPORT_MINUTE = 5
+
+CONF_SHARED_SESSION = "shared_session"
+CONF_SETPOINT_STEP_INTERVAL = "setpoint_step_interval"
+
+DEFAULT_SETPOINT_STEP_INTERVAL = 0.3
+# Per-entity state write throttling, in seconds; 0 writes every update.
+CONF_MIN_WRITE_INTERVAL = "min_write_interval"
+DEFAULT_MIN_WRITE_INTERVAL = 0
+CONF_DEBOUNCE = "debounce"
+DEFAULT_DEBOUNCE = 0
+# Changes of these fields are always written immediately.
+SAFETY_FIELDS = frozenset(("errorCode", "burningState"))
 
 TITLE = "林内智家"
 MANUFACTURER = "林内"
@@ -25,6 +49,8 @@ OPERATION_MAP = {
     "88":  "水温按摩模式",
 }
 
+OPERATION_CODE_MAP = {name: code for code, name in OPERATION_MAP.items()}
+
 OPERATION_COMMAND_MAP = {
     "普通模式": "regularMode", 
     "厨房模式": "kitchenMode",
@@ -34,6 +60,8 @@ OPERATION_COMMAND_MAP = {
     "水温按摩模式": "massageMode",
 }
 
+WATER_HEATER_FIELDS = ["operationMode", "hotWaterTempSetting"]
+
 CYCLE_MODE_MAP = {"0": "标准", "1": "舒适", "2": "节能"}
 
 CYCLE_MODE_COMMAND_MAP = {
@@ -46,12 +74,14 @@ SWITCHES = [
     {
         "icon": "mdi:power-cycle",
         "entity_type": "cycle_reservation",
-        "name": "循环预约"
+        "name": "循环预约",
+        "fields": ["cycleReservationSetting1"],
     },
     {
         "icon": "mdi:water-circle",
         "entity_type": "temporary_cycle_insulation",
-        "name": "一键循环"
+        "name": "一键循环",
+        "fields": ["temporaryCycleInsulationSetting"],
     },
 ]
 
@@ -59,11 +89,13 @@ SELECTS = [
     {
         "entity_type": "cycle_mode",
         "name": "循环模式",
+        "fields": ["cycleModeSetting"],
         "options": list(CYCLE_MODE_MAP.values())
     },
     {
         "entity_type": "operation_mode",
         "name": "模式",
+        "fields": ["operationMode"],
         "options": list(OPERATION_MAP.values())
     },
 ]
@@ -73,8 +105,9 @@ TEXTS = [
         "icon": "mdi:av-timer",
         "entity_type": "cycle_reservation_time",
         "name": "循环预约时间",
+        "fields": ["cycleReservationTimeSetting"],
         "mode": "text",
-        "pattern": r"^(\d+(,\d+)*)?$"
+        "pattern": r"^(\d{1,2}(-\d{1,2})?(,\d{1,2}(-\d{1,2})?)*)?$"
     }
 ]
 
@@ -83,5 +116,78 @@ BINARY_SENSORS = [
         "icon": "mdi:gas-burner",
         "entity_type": "burning_state",
         "name": "燃烧状态",
+        "fields": ["burningState"],
     }
-]
\ No newline at end of file
+]
+
+# Diagnostic metrics, disabled by default.
+ACCOUNT_SENSORS = [
+    {
+        "icon": "mdi:message-flash-outline",
+        "entity_type": "message_rate",
+        "name": "消息速率",
+        "unit": "msg/min",
+        "state_class": "measurement",
+    },
+    {
+        "icon": "mdi:message-alert-outline",
+        "entity_type": "parse_failures",
+        "name": "解析失败",
+        "state_class": "total_increasing",
+    },
+    {
+        "icon": "mdi:content-duplicate",
+        "entity_type": "duplicate_frames",
+        "name": "重复帧",
+        "state_class": "total_increasing",
+    },
+    {
+        "icon": "mdi:lan-connect",
+        "entity_type": "reconnects",
+        "name": "重连次数",
+        "state_class": "total_increasing",
+    },
+    {
+        "icon": "mdi:timer-outline",
+        "entity_type": "connected_time",
+        "name": "连接时长",
+        "unit": "s",
+        "state_class": "total_increasing",
+    },
+    {
+        "icon": "mdi:swap-horizontal",
+        "entity_type": "command_rtt",
+        "name": "指令往返延迟",
+        "unit": "ms",
+        "state_class": "measurement",
+    },
+    {
+        "icon": "mdi:send-clock-outline",
+        "entity_type": "publish_latency",
+        "name": "发送延迟",
+        "unit": "ms",
+        "state_class": "measurement",
+    },
+    {
+        "icon": "mdi:human-queue",
+        "entity_type": "admission_queued",
+        "name": "排队连接",
+        "state_class": "measurement",
+    },
+]
+
+DEVICE_SENSORS = [
+    {
+        "icon": "mdi:clock-alert-outline",
+        "entity_type": "last_frame_age",
+        "name": "距上次消息",
+        "unit": "s",
+        "state_class": "measurement",
+    },
+    {
+        "icon": "mdi:message-outline",
+        "entity_type": "messages",
+        "name": "消息数",
+        "state_class": "total_increasing",
+    },
+]
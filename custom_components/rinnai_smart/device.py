@@ -1,13 +1,35 @@
 """Rinnai device object"""
-from typing import Any, Dict, Optional
+import asyncio
+import logging
+import time
+from collections.abc import Callable, Iterable
 
-from homeassistant.core import HomeAssistant
+from homeassistant.const import UnitOfTime
+from homeassistant.components.recorder import get_instance
+from homeassistant.components.recorder.models import StatisticData, StatisticMetaData
+from homeassistant.components.recorder.statistics import (
+    async_add_external_statistics,
+    get_last_statistics,
+)
+from homeassistant.core import CALLBACK_TYPE, HomeAssistant, callback
+from homeassistant.exceptions import HomeAssistantError
+from homeassistant.helpers.event import async_track_utc_time_change
 from homeassistant.helpers.update_coordinator import DataUpdateCoordinator
+from homeassistant.util import dt as dt_util, slugify
 
 from .const import (
-    DOMAIN, LOGGER, MANUFACTURER, OPERATION_COMMAND_MAP, CYCLE_MODE_MAP, CYCLE_MODE_COMMAND_MAP, OPERATION_MAP
+    DOMAIN, LOGGER, MANUFACTURER, OPERATION_COMMAND_MAP, CYCLE_MODE_MAP, CYCLE_MODE_COMMAND_MAP, OPERATION_MAP,
+    OPERATION_CODE_MAP, CONF_SETPOINT_STEP_INTERVAL, DEFAULT_SETPOINT_STEP_INTERVAL, MIN_TEMP, MAX_TEMP,
+    USAGE_EXPORT_MINUTE,
 )
+from . import reservation
 from .rinnai_client import RinnaiClient
+from .setpoint import TemperatureSetpoint
+from .state import DeviceState
+from .usage import HOUR, UsageTracker
+
+SETPOINT_FIELD = "hotWaterTempSetting"
+BURNING_FIELD = "burningState"
 
 class RinnaiDeviceDataUpdateCoordinator(DataUpdateCoordinator):
     """Rinnai device object"""
@@ -20,8 +42,20 @@ class RinnaiDeviceDataUpdateCoordinator(DataUpdateCoordinator):
         self._client: RinnaiClient = client
         self._device: dict = device
         self._manufacturer: str = MANUFACTURER
-        self._device_information: Optional[Dict[str, Any]] | None = None
+        self._info: dict | None = None
+        self._state: DeviceState | None = None
+        self._optimistic: dict[str, str] = {}
         self.options = options
+        self._field_listeners: dict[object, tuple[Callable[[frozenset, bool], None], frozenset | None]] = {}
+        self._setpoint = TemperatureSetpoint(
+            self._read_setpoint,
+            self._async_send_setpoint_step,
+            self._on_setpoint_done,
+            step_interval=options.get(CONF_SETPOINT_STEP_INTERVAL, DEFAULT_SETPOINT_STEP_INTERVAL),
+        )
+        self.usage = UsageTracker()
+        self._usage_sums: dict[str, float] | None = None
+        self._unsub_usage_export: CALLBACK_TYPE | None = None
         super().__init__(
             hass,
             LOGGER,
@@ -49,107 +83,285 @@ class RinnaiDeviceDataUpdateCoordinator(DataUpdateCoordinator):
         """Return model for device"""
         return self._device["deviceType"][-3:]
 
+    @property
+    def state(self) -> DeviceState | None:
+        """Return the latest decoded snapshot of the device."""
+        return self._state
+
     @property
     def target_temperature(self) -> float:
         """Return the current temperature in degrees F"""
-        return int(self._device_information["hotWaterTempSetting"], 16)
+        return self._state.target_temperature
 
     @property
     def operation_mode(self) -> str:
-        data = int(self._device_information["operationMode"], 16)
-        data &= 0xBF
-        return OPERATION_MAP.get("%02X" % data)
+        return self._state.operation_mode
 
     @property
     def is_heating(self) -> bool:
-        return self._device_information["burningState"] == "1"
+        return self._state.is_heating
 
     @property
     def is_on(self) -> bool:
-        return self._device_information["operationMode"] != "0"
+        return self._state.is_on
     
     @property
     def cycle_mode(self) -> str | None:
-        return CYCLE_MODE_MAP.get(self._device_information["cycleModeSetting"], None)
+        return self._state.cycle_mode
     
     @property
     def is_cycle_reservation_on(self) -> bool:
-        return self._device_information["cycleReservationSetting1"] == "1"
+        return self._state.is_cycle_reservation_on
     
     @property
     def is_temporary_cycle_insulation_on(self) -> bool:
-        return self._device_information["temporaryCycleInsulationSetting"] == "31"
+        return self._state.is_temporary_cycle_insulation_on
     
     @property
     def is_burn_state_on(self) -> bool:
-        return self._device_information["burningState"] == "1"
+        return self._state.is_heating
 
     @property
     def cycle_reservation_time(self) -> str:
-        hours = []
-        hour = 0
-        print(self._device_information)
-        return ""
-        for hex_str in self._device_information["cycleReservationTimeSetting"].split():
-            hex_value = int(hex_str, 16)
-            for i in range(8):
-                if hex_value & (1 << i):
-                    hours.append(str(hour))
-                hour += 1
-        return ','.join(hours)
-
-    async def _async_setup(self) -> None:
-        await self._client.subscribe(self._device["id"], self._update_device)
+        return self._state.cycle_reservation_time
+
+    async def _async_setup(self, flush: bool = True) -> None:
+        await self._client.subscribe(self._device["id"], self._update_device, flush)
+        if self._unsub_usage_export is None:
+            self._unsub_usage_export = async_track_utc_time_change(
+                self.hass, self._async_export_usage, minute=USAGE_EXPORT_MINUTE, second=0
+            )
+
+    def _statistic_id(self, kind: str) -> str:
+        return f"{DOMAIN}:{slugify(self.id)}_{kind}"
+
+    async def _async_export_usage(self, now=None) -> None:
+        """Push the finished hours to long-term statistics as cumulative sums."""
+        if "recorder" not in self.hass.config.components:
+            return
+        if self._usage_sums is None:
+            self._usage_sums = {}
+            for kind in ("burn_time", "ignitions"):
+                statistic_id = self._statistic_id(kind)
+                last = await get_instance(self.hass).async_add_executor_job(
+                    get_last_statistics, self.hass, 1, statistic_id, True, {"sum"}
+                )
+                row = last.get(statistic_id, [{}])[0] if last else {}
+                self._usage_sums[kind] = row.get("sum") or 0.0
+                if row.get("start") is not None:
+                    # Never rewrite hours an earlier run already stored.
+                    start = row["start"]
+                    start = start if isinstance(start, (int, float)) else start.timestamp()
+                    self.usage.mark_exported(max(int(start), self.usage.exported_until or 0))
+        now = time.time()
+        self.usage.advance(now)
+        hours = self.usage.completed_hours(now)
+        if not hours:
+            return
+        burn_time, ignitions = [], []
+        for hour, burn_seconds, count in hours:
+            start = dt_util.utc_from_timestamp(hour)
+            self._usage_sums["burn_time"] += burn_seconds / HOUR
+            self._usage_sums["ignitions"] += count
+            burn_time.append(
+                StatisticData(start=start, state=burn_seconds / HOUR, sum=self._usage_sums["burn_time"])
+            )
+            ignitions.append(
+                StatisticData(start=start, state=count, sum=self._usage_sums["ignitions"])
+            )
+        for kind, name, unit, statistics in (
+            ("burn_time", "燃烧时间", UnitOfTime.HOURS, burn_time),
+            ("ignitions", "点火次数", None, ignitions),
+        ):
+            async_add_external_statistics(
+                self.hass,
+                StatisticMetaData(
+                    has_mean=False,
+                    has_sum=True,
+                    name=f"{self.device_name} {name}",
+                    source=DOMAIN,
+                    statistic_id=self._statistic_id(kind),
+                    unit_of_measurement=unit,
+                ),
+                statistics,
+            )
+        self.usage.mark_exported(hours[-1][0])
 
     async def async_turn_off(self):
-        await self._client.publish(self._device, "power", "00")
+        await self._async_command("power", "00", "operationMode", "0")
 
     async def async_turn_on(self):
-        await self._client.publish(self._device, "power", "01")
+        # Already on: operationMode will not change, so there is nothing to confirm.
+        already_on = self._state is not None and self._state.is_on
+        await self._async_command("power", "01", None if already_on else "operationMode")
 
     async def async_set_temperature(self, temperature: int):
-        previous_temperature = int(self._device_information["hotWaterTempSetting"], 16)
-        if temperature > previous_temperature:
-            await self._client.publish(self._device, "hotWaterTempOperate", "01")
-        elif temperature < previous_temperature:
-            await self._client.publish(self._device, "hotWaterTempOperate", "00")
+        """Start driving the setpoint to temperature, replacing any earlier target."""
+        self._setpoint.set_target(min(max(temperature, MIN_TEMP), MAX_TEMP))
+
+    def _read_setpoint(self) -> int | None:
+        return None if self._state is None else self._state.target_temperature
+
+    async def _async_send_setpoint_step(self, step: str) -> None:
+        await self._client.publish(self._device, "hotWaterTempOperate", step)
+
+    @callback
+    def _on_setpoint_done(self) -> None:
+        self._notify_listeners(frozenset((SETPOINT_FIELD,)), immediate=True)
 
     async def async_set_operation_mode(self, operation_mode):
         command_id = OPERATION_COMMAND_MAP.get(operation_mode)
         if command_id:
-            await self._client.publish(self._device, command_id, "01")
+            # Compare decoded modes: the raw value carries extra flag bits
+            # (e.g. "C2" for "82"), so it never equals the code sent.
+            selected = self._state is not None and self._state.operation_mode == operation_mode
+            await self._async_command(
+                command_id,
+                "01",
+                None if selected else "operationMode",
+                OPERATION_CODE_MAP.get(operation_mode),
+            )
 
     async def async_set_cycle_mode(self, cycle_mode):
-        await self._client.publish(self._device, "cycleModeSetting", CYCLE_MODE_COMMAND_MAP[cycle_mode])
+        data = CYCLE_MODE_COMMAND_MAP[cycle_mode]
+        await self._async_command("cycleModeSetting", data, "cycleModeSetting", str(int(data, 16)))
 
     async def async_turn_on_cycle_reservation(self):
-        await self._client.publish(self._device, "cycleReservationSetting1", "01")
+        await self._async_command("cycleReservationSetting1", "01", "cycleReservationSetting1", "1")
 
     async def async_turn_off_cycle_reservation(self):
-        await self._client.publish(self._device, "cycleReservationSetting1", "00")
+        await self._async_command("cycleReservationSetting1", "00", "cycleReservationSetting1", "0")
 
     async def async_turn_on_temporary_cycle_insulation(self):
-        await self._client.publish(self._device, "temporaryCycleInsulationSetting", "31")
+        await self._async_command(
+            "temporaryCycleInsulationSetting", "31", "temporaryCycleInsulationSetting", "31"
+        )
 
     async def async_turn_off_temporary_cycle_insulation(self):
-        await self._client.publish(self._device, "temporaryCycleInsulationSetting", "30")
+        await self._async_command(
+            "temporaryCycleInsulationSetting", "30", "temporaryCycleInsulationSetting", "30"
+        )
 
     async def async_set_cycle_reservation_time(self, value: str):
-        hours = [0, 0, 0]
-        for hour in value.split(","):
-            hour = int(hour, 10)
-            index = int(hour / 8)
-            bit = hour % 8
-            hours[index] |= (1<<bit)
-        data = " ".join(["%02X" % hour for hour in hours])
-        await self._client.publish(self._device, "cycleReservationTimeSetting", data)
+        try:
+            data = reservation.encode(reservation.parse(value))
+        except ValueError as e:
+            raise HomeAssistantError(f"Invalid reservation hours {value!r}: {e}") from e
+        await self._async_command(
+            "cycleReservationTimeSetting", data, "cycleReservationTimeSetting", data
+        )
+
+    async def _async_command(
+        self,
+        command_id: str,
+        command_data: str,
+        ack_field: str | None = None,
+        optimistic: str | None = None,
+    ) -> None:
+        """Publish a command, showing the optimistic value until it is confirmed.
+
+        The device confirms a command by reporting a change of ack_field on
+        res/. Without a confirmation before the deadline the optimistic value
+        is rolled back.
+        """
+        if ack_field is None or (self._info is not None and self._info.get(ack_field) == optimistic):
+            # Nothing will change on the device side, so nothing to confirm.
+            await self._client.publish(self._device, command_id, command_data)
+            return
+        if optimistic is not None:
+            self._optimistic[ack_field] = optimistic
+            self._set_state(frozenset((ack_field,)), immediate=True)
+        try:
+            ack = await self._client.publish(self._device, command_id, command_data, ack_field)
+        except Exception:
+            self._rollback(ack_field)
+            raise
+        self.hass.async_create_background_task(
+            self._async_wait_ack(ack, command_id, ack_field), f"{self.name}-{command_id}-ack"
+        )
+
+    async def _async_wait_ack(self, ack, command_id: str, ack_field: str) -> None:
+        try:
+            rtt = await ack
+        except asyncio.TimeoutError:
+            LOGGER.warning(
+                "Rinnai device %s did not confirm %s, rolling back %s",
+                self.id, command_id, ack_field,
+            )
+            self._rollback(ack_field)
+            return
+        LOGGER.debug("Rinnai device %s confirmed %s in %.0f ms", self.id, command_id, rtt * 1000)
+
+    @callback
+    def _rollback(self, field: str) -> None:
+        if self._optimistic.pop(field, None) is not None:
+            self._set_state(frozenset((field,)), immediate=True)
+
+    @callback
+    def _set_state(self, changed: frozenset, immediate: bool = False) -> None:
+        info = self._info or {}
+        self._state = DeviceState({**info, **self._optimistic} if self._optimistic else info)
+        self._notify_listeners(changed, immediate)
+
+    @callback
+    def async_add_field_listener(
+        self,
+        update_callback: Callable[[frozenset, bool], None],
+        fields: Iterable[str] | None = None,
+    ) -> CALLBACK_TYPE:
+        """Listen for changes of the given fields, or of any field if None.
+
+        The callback gets the changed fields and whether the change answers a
+        user action (optimistic state, rollback) and should not be delayed.
+        """
+        key = object()
+        self._field_listeners[key] = (
+            update_callback, None if fields is None else frozenset(fields)
+        )
+
+        @callback
+        def remove_listener() -> None:
+            self._field_listeners.pop(key, None)
+
+        return remove_listener
+
+    async def async_shutdown(self) -> None:
+        self._setpoint.cancel()
+        if self._unsub_usage_export is not None:
+            self._unsub_usage_export()
+            self._unsub_usage_export = None
+        await super().async_shutdown()
+
+    @callback
+    def _notify_listeners(self, changed: frozenset, immediate: bool = False) -> None:
+        if not changed:
+            return
+        for update_callback, fields in list(self._field_listeners.values()):
+            if fields is None or not fields.isdisjoint(changed):
+                update_callback(changed, immediate)
 
     async def _async_update_data(self):
-        return self._device_information
+        """Resync from the cloud; only runs when a refresh is requested explicitly."""
+        await self._client.resync([self.id])
+        return self._state
 
-    async def _update_device(self, device_info: dict) -> None:
+    async def _update_device(self, device_info: dict, changed: frozenset) -> None:
         """Update the device information from the API"""
-        self._device_information = device_info
-        self.async_update_listeners()
+        self._info = device_info
+        if BURNING_FIELD in changed:
+            self.usage.update(device_info.get(BURNING_FIELD) == "1", time.time())
+        for field in changed.intersection(self._optimistic):
+            # Confirmed (or overridden) by the device itself.
+            del self._optimistic[field]
+        if SETPOINT_FIELD in changed and self._setpoint.active:
+            # Intermediate setpoints are reported once the target is reached.
+            self._setpoint.notify()
+            changed = changed - {SETPOINT_FIELD}
+        self._set_state(changed)
 
-        LOGGER.debug("Rinnai device data: %s", self._device_information)
+        if LOGGER.isEnabledFor(logging.DEBUG):
+            LOGGER.debug(
+                "Rinnai device %s changed: %s",
+                self.id,
+                {field: device_info.get(field) for field in changed},
+            )
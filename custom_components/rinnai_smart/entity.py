@@ -1,23 +1,35 @@
 from __future__ import annotations
 
+import time
+from collections.abc import Iterable
 from typing import Any
 
+from homeassistant.core import CALLBACK_TYPE, callback
 from homeassistant.helpers.entity import DeviceInfo, Entity
+from homeassistant.helpers.event import async_call_later
 
-from .const import DOMAIN as RINNAI_DOMAIN
+from .const import (
+    CONF_DEBOUNCE,
+    CONF_MIN_WRITE_INTERVAL,
+    DEFAULT_DEBOUNCE,
+    DEFAULT_MIN_WRITE_INTERVAL,
+    DOMAIN as RINNAI_DOMAIN,
+    SAFETY_FIELDS,
+)
 from .device import RinnaiDeviceDataUpdateCoordinator
 
 class RinnaiEntity(Entity):
     """A base class for Rinnai entities."""
 
     _attr_force_update = False
-    _attr_should_poll = True
+    _attr_should_poll = False
     
     def __init__(
         self,
         entity_type: str,
         name: str,
         device: RinnaiDeviceDataUpdateCoordinator,
+        fields: Iterable[str] | None = None,
         **kwargs,
     ) -> None:
         """Init Rinnai entity."""
@@ -25,7 +37,15 @@ class RinnaiEntity(Entity):
         self._attr_unique_id = f"{device.id}_{entity_type}"
 
         self._device: RinnaiDeviceDataUpdateCoordinator = device
+        self._fields = fields
         self._state: Any = None
+        self._min_write_interval: float = device.options.get(
+            CONF_MIN_WRITE_INTERVAL, DEFAULT_MIN_WRITE_INTERVAL
+        )
+        self._debounce: float = device.options.get(CONF_DEBOUNCE, DEFAULT_DEBOUNCE)
+        self._last_write = 0.0
+        self._pending_since: float | None = None
+        self._unsub_pending_write: CALLBACK_TYPE | None = None
 
     @property
     def device_info(self) -> DeviceInfo:
@@ -37,10 +57,56 @@ class RinnaiEntity(Entity):
             name=self._device.device_name,
         )
     
-    async def async_update(self):
-        """Update Rinnai entity."""
-        await self._device.async_request_refresh()
+    @callback
+    def _handle_device_update(self, changed: frozenset, immediate: bool = False) -> None:
+        """Write state when one of the fields this entity reads changed.
+
+        Writes are at least min_write_interval apart, and with a debounce a
+        burst of updates is written once it has been quiet for that long, or
+        at the latest debounce + min_write_interval after it started. Safety
+        fields and answers to user actions are written immediately.
+        """
+        if (
+            immediate
+            or not (self._min_write_interval or self._debounce)
+            or not SAFETY_FIELDS.isdisjoint(changed)
+        ):
+            self._write_now()
+            return
+        now = time.monotonic()
+        if self._pending_since is None:
+            self._pending_since = now
+        due = max(
+            self._last_write + self._min_write_interval,
+            min(now + self._debounce, self._pending_since + self._debounce + self._min_write_interval),
+        )
+        if due <= now:
+            self._write_now()
+            return
+        self._cancel_pending_write()
+        self._unsub_pending_write = async_call_later(self.hass, due - now, self._write_pending)
+
+    @callback
+    def _write_pending(self, _now) -> None:
+        self._unsub_pending_write = None
+        self._write_now()
+
+    @callback
+    def _write_now(self) -> None:
+        self._cancel_pending_write()
+        self._pending_since = None
+        self._last_write = time.monotonic()
+        self.async_write_ha_state()
+
+    @callback
+    def _cancel_pending_write(self) -> None:
+        if self._unsub_pending_write is not None:
+            self._unsub_pending_write()
+            self._unsub_pending_write = None
 
     async def async_added_to_hass(self):
         """When entity is added to hass"""
-        self.async_on_remove(self._device.async_add_listener(self.async_write_ha_state))
\ No newline at end of file
+        self.async_on_remove(
+            self._device.async_add_field_listener(self._handle_device_update, self._fields)
+        )
+        self.async_on_remove(self._cancel_pending_write)
@@ -0,0 +1,89 @@
+"""Decoder for the JSON frames Rinnai devices publish on their res/ topic."""
+
+import json
+import re
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - optional speedup
+    orjson = None
+
+PTN_J00 = b'"J00"'
+
+# The devices emit trailing commas such as `{"id":"x","data":"1",}`.
+_TRAILING_COMMA = re.compile(rb",\s*([}\]])")
+
+if orjson is not None:
+    _loads = orjson.loads
+    JSONDecodeError = orjson.JSONDecodeError
+else:
+    _loads = json.loads
+    JSONDecodeError = json.JSONDecodeError
+
+
+def _parse(payload: bytes) -> dict:
+    try:
+        return _loads(payload)
+    except JSONDecodeError:
+        # Only pay for the regex pass on frames that are actually malformed.
+        return _loads(_TRAILING_COMMA.sub(rb"\1", payload))
+
+
+def decode_frame(payload: bytes | str) -> dict[str, str] | None:
+    """Decode a raw frame into a {field id: data} mapping.
+
+    Returns None for frames that are not J00 frames. Raises ValueError (or
+    UnicodeDecodeError) when the frame cannot be parsed.
+    """
+    if isinstance(payload, str):
+        payload = payload.encode("utf-8")
+    if PTN_J00 not in payload:
+        return None
+    data = _parse(payload)
+    if data.get("ptn", "") != "J00":
+        return None
+    return {
+        item["id"]: item["data"]
+        for item in data.get("enl", ())
+        if "id" in item and "data" in item
+    }
+
+
+def frame_body(payload: bytes) -> bytes:
+    """Return the enl part of a frame, leaving out per-frame fields such as It."""
+    start = payload.find(b'"enl"')
+    end = payload.rfind(b"]")
+    if start < 0 or end < start:
+        return payload
+    return payload[start:end]
+
+
+class FrameDeduplicator:
+    """Detect frames that repeat a device's previous frame within `window` seconds.
+
+    Only the first copy of an unchanged frame is accepted per window. hits and
+    misses count dropped and accepted frames.
+    """
+
+    def __init__(self, window: float = 30.0):
+        self.window = window
+        self.hits = 0
+        self.misses = 0
+        self._last: dict[str, tuple[int, float]] = {}
+
+    def is_duplicate(self, key: str, payload: bytes, now: float) -> bool:
+        digest = hash(frame_body(payload))
+        last = self._last.get(key)
+        if last is not None and last[0] == digest and now - last[1] <= self.window:
+            self.hits += 1
+            return True
+        self._last[key] = (digest, now)
+        self.misses += 1
+        return False
+
+    def reset(self, key: str | None = None) -> None:
+        """Forget the last frame, so the next one is accepted."""
+        if key is None:
+            self._last.clear()
+        else:
+            self._last.pop(key, None)
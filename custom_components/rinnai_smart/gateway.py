@@ -0,0 +1,327 @@
+"""Standalone gateway: Rinnai cloud accounts to a local MQTT broker.
+
+One process holds the cloud connections of many accounts and republishes
+device state to a local broker as retained topics:
+
+    <prefix>/status                     "online" / "offline" (last will)
+    <prefix>/<device id>/device         JSON: name, model, mac
+    <prefix>/<device id>/state          JSON: decoded state, see DeviceState
+    <prefix>/<device id>/<field>        raw field value, e.g. burningState
+
+Commands are routed back to the cloud from
+
+    <prefix>/<device id>/set/<command id>   payload: command data, e.g. "01"
+
+using the same command ids as the res/ protocol (power, hotWaterTempOperate,
+cycleModeSetting, ...). The configuration is a JSON file:
+
+    {
+        "broker": {"host": "localhost", "port": 1883, "username": null, "password": null},
+        "prefix": "rinnai",
+        "token_file": "rinnai_tokens.json",
+        "accounts": [{"username": "...", "password": "..."}]
+    }
+
+An optional "cloud" object overrides the RinnaiClient endpoints
+(api_base_url, mqtt_host, mqtt_port, mqtt_tls), e.g. for local stand-ins.
+An optional "instance_id" keeps the cloud MQTT client ids of this gateway
+apart from other processes on the same accounts; it defaults to one derived
+from the host and the prefix, and must stay the same across restarts.
+
+Nothing here depends on Home Assistant; run it with rinnai_gateway.py.
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import os
+import random
+import uuid
+
+import aiohttp
+import aiomqtt
+
+from .admission import AdmissionController
+from .const import LOGGER
+from .rinnai_client import (
+    HTTP_DNS_CACHE_TTL,
+    HTTP_KEEPALIVE_TIMEOUT,
+    RECONNECT_BASE,
+    RECONNECT_CAP,
+    RinnaiClient,
+)
+from .state import DeviceState
+
+DEFAULT_PREFIX = "rinnai"
+GATEWAY_HTTP_CONNECTION_LIMIT = 32
+ACCOUNT_STARTUP_CONCURRENCY = 8
+LOCAL_QUEUE_SIZE = 10000
+TOKEN_SAVE_INTERVAL = 30
+
+STATE_ATTRIBUTES = (
+    "target_temperature",
+    "operation_mode",
+    "is_on",
+    "is_heating",
+    "cycle_mode",
+    "is_cycle_reservation_on",
+    "is_temporary_cycle_insulation_on",
+    "cycle_reservation_time",
+)
+
+
+def normalized_state(state: DeviceState) -> dict:
+    return {name: getattr(state, name) for name in STATE_ATTRIBUTES}
+
+
+class Gateway:
+    """Bridge any number of Rinnai accounts to one local MQTT broker."""
+
+    def __init__(
+        self,
+        accounts: list[dict],
+        broker: dict,
+        prefix: str = DEFAULT_PREFIX,
+        token_file: str | None = None,
+        cloud: dict | None = None,
+        instance_id: str | None = None,
+    ):
+        self._accounts = accounts
+        self._cloud = cloud or {}
+        self._instance_id = instance_id or f"gateway-{uuid.getnode():012x}-{prefix}"
+        self._broker = broker
+        self._prefix = prefix.rstrip("/")
+        self._token_file = token_file
+        self._tokens: dict[str, dict] = {}
+        self._tokens_dirty = False
+        self._clients: dict[str, RinnaiClient] = {}
+        # device id -> (client, device dict)
+        self._routes: dict[str, tuple[RinnaiClient, dict]] = {}
+        self._states: dict[str, dict] = {}
+        self._outbox: asyncio.Queue = asyncio.Queue(LOCAL_QUEUE_SIZE)
+        self.dropped = 0
+        self._tasks: list[asyncio.Task] = []
+        self._commands: set[asyncio.Task] = set()
+        self._session: aiohttp.ClientSession | None = None
+        self.admission: AdmissionController | None = None
+
+    def _load_tokens(self) -> None:
+        if self._token_file and os.path.exists(self._token_file):
+            with open(self._token_file, encoding="utf-8") as file:
+                self._tokens = json.load(file)
+
+    def _save_tokens(self) -> None:
+        tmp = f"{self._token_file}.tmp"
+        with open(tmp, "w", encoding="utf-8") as file:
+            json.dump(self._tokens, file)
+        os.replace(tmp, self._token_file)
+
+    async def _token_saver(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            await asyncio.sleep(TOKEN_SAVE_INTERVAL)
+            if self._tokens_dirty:
+                self._tokens_dirty = False
+                await loop.run_in_executor(None, self._save_tokens)
+
+    def _on_token(self, username: str):
+        def on_token(token: dict) -> None:
+            self._tokens[username] = token
+            self._tokens_dirty = True
+
+        return on_token
+
+    def _enqueue(self, topic: str, payload: str) -> None:
+        try:
+            self._outbox.put_nowait((topic, payload))
+        except asyncio.QueueFull:
+            self.dropped += 1
+
+    def _device_topic(self, device_id: str, suffix: str) -> str:
+        return f"{self._prefix}/{device_id}/{suffix}"
+
+    def _publish_device(self, device_id: str) -> None:
+        client, device = self._routes[device_id]
+        self._enqueue(
+            self._device_topic(device_id, "device"),
+            json.dumps(
+                {"name": device.get("name"), "model": device.get("deviceType"), "mac": device.get("mac")},
+                ensure_ascii=False,
+            ),
+        )
+        info = client.devices.get(device_id, {}).get("info", {})
+        self._publish_fields(device_id, info, frozenset(info), force=True)
+
+    def _publish_fields(self, device_id: str, info: dict, changed: frozenset, force: bool = False) -> None:
+        for field in changed:
+            value = info.get(field)
+            if value is not None:
+                self._enqueue(self._device_topic(device_id, field), str(value))
+        state = normalized_state(DeviceState(info))
+        if force or state != self._states.get(device_id):
+            self._states[device_id] = state
+            self._enqueue(self._device_topic(device_id, "state"), json.dumps(state, ensure_ascii=False))
+
+    def _on_update(self, device_id: str):
+        async def on_update(info: dict, changed: frozenset) -> None:
+            self._publish_fields(device_id, info, changed)
+
+        return on_update
+
+    async def _start_account(self, account: dict, semaphore: asyncio.Semaphore) -> None:
+        username = account["username"]
+        client = RinnaiClient(
+            username,
+            account["password"],
+            session=self._session,
+            token=self._tokens.get(username),
+            on_token=self._on_token(username),
+            admission=self.admission,
+            instance_id=self._instance_id,
+            **self._cloud,
+        )
+        self._clients[username] = client
+        delay = RECONNECT_BASE
+        while True:
+            async with semaphore:
+                try:
+                    devices = await client.get_devices()
+                except Exception as e:
+                    LOGGER.error(f"Failed to load devices of {username}: {e}")
+                    devices = None
+            if devices is not None:
+                break
+            LOGGER.warning(f"Retrying {username} in {delay:.0f} s")
+            await asyncio.sleep(delay)
+            delay = min(RECONNECT_CAP, random.uniform(RECONNECT_BASE, delay * 3))
+        if not devices:
+            # get_devices() raises when the list cannot be loaded, so this
+            # account really has nothing to bridge.
+            LOGGER.warning(f"No devices for {username}")
+            return
+        for device_id, value in devices.items():
+            self._routes[device_id] = (client, value["device"])
+            await client.subscribe(device_id, self._on_update(device_id), flush=False)
+            self._publish_device(device_id)
+        self._tasks.append(asyncio.create_task(client.run(), name=f"rinnai-{username}"))
+        LOGGER.info(f"Account {username}: {len(devices)} devices")
+
+    async def _handle_command(self, topic: str, payload: bytes) -> None:
+        # <prefix>/<device id>/set/<command id>
+        tokens = topic[len(self._prefix) + 1:].split("/")
+        if len(tokens) != 3 or tokens[1] != "set":
+            return
+        route = self._routes.get(tokens[0])
+        if route is None:
+            LOGGER.warning(f"Command for unknown device: {topic}")
+            return
+        client, device = route
+        data = payload.decode("utf-8").strip()
+        try:
+            await client.publish(device, tokens[2], data)
+        except Exception as e:
+            LOGGER.error(f"Failed to send {tokens[2]}={data} to {tokens[0]}: {e}")
+
+    async def _drain(self, broker: aiomqtt.Client) -> None:
+        while True:
+            topic, payload = await self._outbox.get()
+            await broker.publish(topic, payload, qos=0, retain=True)
+
+    async def _run_broker(self) -> None:
+        status = f"{self._prefix}/status"
+        delay = RECONNECT_BASE
+        while True:
+            try:
+                async with aiomqtt.Client(
+                    self._broker.get("host", "localhost"),
+                    self._broker.get("port", 1883),
+                    username=self._broker.get("username"),
+                    password=self._broker.get("password"),
+                    will=aiomqtt.Will(status, "offline", qos=1, retain=True),
+                ) as broker:
+                    LOGGER.info("Connected to local broker")
+                    delay = RECONNECT_BASE
+                    await broker.publish(status, "online", qos=1, retain=True)
+                    await broker.subscribe(f"{self._prefix}/+/set/+", qos=1)
+                    # The broker may have lost its retained messages, so start
+                    # over from the full state instead of what queued up offline.
+                    while not self._outbox.empty():
+                        self._outbox.get_nowait()
+                    for device_id in self._routes:
+                        self._publish_device(device_id)
+                    drain = asyncio.create_task(self._drain(broker))
+                    try:
+                        async for message in broker.messages:
+                            # A slow or offline account must not hold up the others.
+                            command = asyncio.create_task(
+                                self._handle_command(message.topic.value, message.payload)
+                            )
+                            self._commands.add(command)
+                            command.add_done_callback(self._commands.discard)
+                    finally:
+                        drain.cancel()
+            except aiomqtt.MqttError as e:
+                LOGGER.warning(f"Local broker connection lost: {e}, reconnecting in {delay} s")
+            await asyncio.sleep(delay)
+            delay = min(RECONNECT_CAP, delay * 2)
+
+    async def run(self) -> None:
+        self._load_tokens()
+        self.admission = AdmissionController()
+        self._session = aiohttp.ClientSession(
+            connector=aiohttp.TCPConnector(
+                limit_per_host=GATEWAY_HTTP_CONNECTION_LIMIT,
+                keepalive_timeout=HTTP_KEEPALIVE_TIMEOUT,
+                ttl_dns_cache=HTTP_DNS_CACHE_TTL,
+            )
+        )
+        tasks = self._tasks
+        try:
+            if self._token_file:
+                tasks.append(asyncio.create_task(self._token_saver()))
+            semaphore = asyncio.Semaphore(ACCOUNT_STARTUP_CONCURRENCY)
+            # Each account keeps retrying on its own, so one that is down at
+            # startup is picked up later instead of being dropped.
+            tasks.extend(
+                asyncio.create_task(
+                    self._start_account(account, semaphore), name=f"rinnai-start-{account['username']}"
+                )
+                for account in self._accounts
+            )
+            await self._run_broker()
+        finally:
+            for task in [*tasks, *self._commands]:
+                task.cancel()
+            for client in self._clients.values():
+                await client.close()
+            await self._session.close()
+            if self._token_file and self._tokens_dirty:
+                self._save_tokens()
+
+
+def main(argv: list[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(description="Bridge Rinnai cloud accounts to a local MQTT broker.")
+    parser.add_argument("config", help="JSON configuration file")
+    parser.add_argument("--debug", action="store_true")
+    args = parser.parse_args(argv)
+    logging.basicConfig(
+        level=logging.DEBUG if args.debug else logging.INFO,
+        format="%(asctime)s %(levelname)s %(name)s: %(message)s",
+    )
+    with open(args.config, encoding="utf-8") as file:
+        config = json.load(file)
+    gateway = Gateway(
+        config["accounts"],
+        config.get("broker", {}),
+        config.get("prefix", DEFAULT_PREFIX),
+        config.get("token_file"),
+        config.get("cloud"),
+        config.get("instance_id"),
+    )
+    try:
+        import uvloop
+    except ImportError:
+        asyncio.run(gateway.run())
+    else:
+        uvloop.run(gateway.run())
@@ -0,0 +1,88 @@
+"""Lightweight runtime metrics for the cloud link.
+
+Updates are plain attribute arithmetic (plus a bisect for histograms) so they
+can sit on the per-message path. Readers such as the diagnostic sensors pull
+values whenever they like.
+"""
+
+from bisect import bisect_left
+
+LATENCY_BUCKETS_MS = (1, 2, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000, 30000)
+
+
+class Counter:
+    __slots__ = ("value",)
+
+    def __init__(self):
+        self.value = 0
+
+    def inc(self, amount: int = 1) -> None:
+        self.value += amount
+
+
+class Gauge:
+    __slots__ = ("value",)
+
+    def __init__(self):
+        self.value = None
+
+    def set(self, value) -> None:
+        self.value = value
+
+
+class Histogram:
+    """Fixed-bucket histogram; the last bucket counts values above all bounds."""
+
+    __slots__ = ("bounds", "counts", "count", "sum")
+
+    def __init__(self, bounds=LATENCY_BUCKETS_MS):
+        self.bounds = tuple(bounds)
+        self.counts = [0] * (len(self.bounds) + 1)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect_left(self.bounds, value)] += 1
+        self.count += 1
+        self.sum += value
+
+    @property
+    def mean(self) -> float | None:
+        return self.sum / self.count if self.count else None
+
+    def quantile(self, q: float) -> float | None:
+        """Return the upper bound of the bucket holding the q-quantile."""
+        if not self.count:
+            return None
+        rank = q * self.count
+        seen = 0
+        for index, count in enumerate(self.counts):
+            seen += count
+            if seen >= rank:
+                return self.bounds[min(index, len(self.bounds) - 1)]
+        return self.bounds[-1]
+
+
+class MetricsRegistry:
+    """Named metrics, optionally split by a label such as a device id."""
+
+    def __init__(self):
+        self._metrics: dict[tuple[str, str | None], object] = {}
+
+    def _get(self, factory, name: str, label: str | None, *args):
+        key = (name, label)
+        metric = self._metrics.get(key)
+        if metric is None:
+            metric = self._metrics[key] = factory(*args)
+        return metric
+
+    def counter(self, name: str, label: str | None = None) -> Counter:
+        return self._get(Counter, name, label)
+
+    def gauge(self, name: str, label: str | None = None) -> Gauge:
+        return self._get(Gauge, name, label)
+
+    def histogram(
+        self, name: str, label: str | None = None, bounds=LATENCY_BUCKETS_MS
+    ) -> Histogram:
+        return self._get(Histogram, name, label, bounds)
@@ -0,0 +1,70 @@
+"""Codec for the 24-hour cycle reservation bitmask.
+
+The device reports and accepts `cycleReservationTimeSetting` as three hex
+bytes, "HH HH HH". Bit n of byte k is set when hour 8 * k + n is reserved.
+Users edit the hours as text such as "6-8,18-22".
+"""
+
+HOURS = 24
+BYTES = HOURS // 8
+
+# Hours (0-7) set in each byte value, and the hex form of each byte value.
+_BYTE_HOURS = tuple(
+    tuple(bit for bit in range(8) if value & (1 << bit)) for value in range(256)
+)
+_BYTE_HEX = tuple("%02X" % value for value in range(256))
+_HEX_BYTE = {text: value for value, text in enumerate(_BYTE_HEX)}
+_HEX_BYTE.update({text.lower(): value for text, value in list(_HEX_BYTE.items())})
+
+
+def decode(data: str) -> tuple[int, ...]:
+    """Return the reserved hours in a "HH HH HH" string, in ascending order."""
+    hours = []
+    for index, token in enumerate(data.split()[:BYTES]):
+        value = _HEX_BYTE.get(token)
+        if value is None:
+            value = int(token, 16) & 0xFF
+        base = index * 8
+        hours.extend(base + bit for bit in _BYTE_HOURS[value])
+    return tuple(hours)
+
+
+def encode(hours) -> str:
+    """Return the "HH HH HH" string for an iterable of hours."""
+    data = [0] * BYTES
+    for hour in hours:
+        if not 0 <= hour < HOURS:
+            raise ValueError(f"Hour out of range: {hour}")
+        data[hour >> 3] |= 1 << (hour & 7)
+    return " ".join(_BYTE_HEX[value] for value in data)
+
+
+def parse(text: str) -> tuple[int, ...]:
+    """Parse hours and inclusive ranges such as "6-8,18-22"."""
+    hours = set()
+    for part in text.replace(" ", "").split(","):
+        if not part:
+            continue
+        first, _, last = part.partition("-")
+        start = int(first)
+        end = int(last) if last else start
+        if not 0 <= start <= end < HOURS:
+            raise ValueError(f"Invalid hour range: {part}")
+        hours.update(range(start, end + 1))
+    return tuple(sorted(hours))
+
+
+def format_hours(hours) -> str:
+    """Format ascending hours compactly, e.g. (6, 7, 8, 18) -> "6-8,18"."""
+    parts = []
+    start = previous = None
+    for hour in hours:
+        if previous is not None and hour == previous + 1:
+            previous = hour
+            continue
+        if start is not None:
+            parts.append(str(start) if start == previous else f"{start}-{previous}")
+        start = previous = hour
+    if start is not None:
+        parts.append(str(start) if start == previous else f"{start}-{previous}")
+    return ",".join(parts)
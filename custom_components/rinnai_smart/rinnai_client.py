@@ -1,3 +1,4 @@
+import contextlib
 import hashlib
 import logging
 import aiohttp
@@ -7,19 +8,202 @@ import ssl
 import json
 import aiomqtt
 import datetime
-import re
+import random
+import time
+
+from .admission import AdmissionController
+from .capture import FrameRecorder
+from .frame import FrameDeduplicator, decode_frame
+from .metrics import MetricsRegistry
 
-logging.basicConfig(level=logging.DEBUG)
 LOGGER = logging.getLogger(__package__)
 
+API_BASE_URL = "https://iot.rinnai.com.cn"
+MQTT_HOST = "mqtt.rinnai.com.cn"
+MQTT_PORT = 8883
+HTTP_CONNECTION_LIMIT = 8
+HTTP_KEEPALIVE_TIMEOUT = 60
+HTTP_DNS_CACHE_TTL = 300
+DEVICE_FETCH_CONCURRENCY = 4
+DEVICE_FETCH_TIMEOUT = 15
+COMMAND_COALESCE_WINDOW = 0.05
+OUTBOUND_QUEUE_SIZE = 64
+OUTBOUND_DEADLINE = 30
+RECONNECT_BASE = 5
+RECONNECT_CAP = 300
+STABLE_CONNECTION = 60
+RESYNC_GRACE = 5
+DUPLICATE_FRAME_WINDOW = 30
+COMMAND_ACK_TIMEOUT = 15
+TOKEN_REFRESH_RATIO = 0.8
+TOKEN_MIN_LIFETIME = 60
+LOGIN_RETRY_BASE = 5
+LOGIN_RETRY_CAP = 300
+FRAME_LOG_INTERVAL = 60
+
+
+class LogSampler:
+    """Allow one log line per key every `interval` seconds."""
+
+    def __init__(self, interval: float = FRAME_LOG_INTERVAL):
+        self.interval = interval
+        self._next: dict[str, float] = {}
+
+    def allow(self, key: str) -> bool:
+        now = time.monotonic()
+        if now < self._next.get(key, 0):
+            return False
+        self._next[key] = now + self.interval
+        return True
+
+
+class TokenManager:
+    """Owns the API token: one login at a time, refreshed ahead of expiry.
+
+    The server does not announce how long a token lives, so the lifetime is
+    learned from the age of the first token it rejects. Once known, tokens
+    are refreshed after TOKEN_REFRESH_RATIO of that lifetime. After a failed
+    login no new attempt is made for a jittered, growing delay, so a wrong
+    password or an API outage does not turn every request into a login.
+    """
+
+    def __init__(self, login, state: dict | None = None, on_change=None):
+        self._login = login
+        self._on_change = on_change
+        state = state or {}
+        self.token: str = state.get("token", "")
+        self.issued_at: float = state.get("issued_at", 0.0)
+        self.lifetime: float | None = state.get("lifetime")
+        self._inflight: asyncio.Future | None = None
+        self._retry_at = 0.0
+        self._retry_delay = LOGIN_RETRY_BASE
+
+    def as_dict(self) -> dict:
+        return {"token": self.token, "issued_at": self.issued_at, "lifetime": self.lifetime}
+
+    def _expiring(self) -> bool:
+        return (
+            self.lifetime is not None
+            and time.time() - self.issued_at >= self.lifetime * TOKEN_REFRESH_RATIO
+        )
+
+    async def get(self) -> str:
+        """Return a usable token, logging in first if needed."""
+        if self.token and not self._expiring():
+            return self.token
+        return await self.refresh()
+
+    async def refresh(self) -> str:
+        """Log in, or join the login that is already in flight.
+
+        Returns "" if the login failed or a recent failure is still cooling down.
+        """
+        if self._inflight is None or self._inflight.done():
+            if time.monotonic() < self._retry_at:
+                return ""
+            self._inflight = asyncio.ensure_future(self._refresh())
+        return await asyncio.shield(self._inflight)
+
+    def _failed(self) -> None:
+        LOGGER.warning(f"Login failed, not retrying for {self._retry_delay:.0f} s")
+        self._retry_at = time.monotonic() + self._retry_delay
+        self._retry_delay = min(LOGIN_RETRY_CAP, random.uniform(LOGIN_RETRY_BASE, self._retry_delay * 3))
+
+    async def _refresh(self) -> str:
+        try:
+            token = await self._login()
+        except Exception:
+            self._failed()
+            raise
+        if not token:
+            self._failed()
+            return ""
+        self._retry_delay = LOGIN_RETRY_BASE
+        self.token = token
+        self.issued_at = time.time()
+        if self._on_change is not None:
+            self._on_change(self.as_dict())
+        return token
+
+    def invalidate(self, token: str) -> None:
+        """Drop a token the server rejected and learn from its age."""
+        if not token or token != self.token:
+            return
+        if self.issued_at:
+            age = time.time() - self.issued_at
+            if age >= TOKEN_MIN_LIFETIME:
+                self.lifetime = age if self.lifetime is None else min(self.lifetime, age)
+        self.token = ""
+
+
+class RinnaiApiError(Exception):
+    """The cloud API answered, but not with what was asked for."""
+
+
+# Body codes the API uses for a missing or expired token.
+AUTH_ERROR_CODES = {401, "401"}
+
+
+def _is_auth_error(response: dict) -> bool:
+    """Tell a rejected token apart from other failures, e.g. an offline device."""
+    if response.get("code") in AUTH_ERROR_CODES:
+        return True
+    message = str(response.get("message") or response.get("msg") or "").lower()
+    return "token" in message
+
+
+def _is_client_error(e: Exception) -> bool:
+    """4xx responses will not succeed on retry."""
+    return isinstance(e, aiohttp.ClientResponseError) and 400 <= e.status < 500
+
+
+def _admit(admission: AdmissionController | None, kind: str):
+    """Wait for an admission slot when a controller is shared, else run at once."""
+    return contextlib.nullcontext() if admission is None else admission.admit(kind)
+
+
 class HTTPClient:
-    def __init__(self, username: str, password: str):
+    def __init__(
+        self,
+        username: str,
+        password: str,
+        session: aiohttp.ClientSession | None = None,
+        base_url: str = API_BASE_URL,
+        token: dict | None = None,
+        on_token=None,
+        admission: AdmissionController | None = None,
+    ):
         self._username = username
         self._password = str.upper(hashlib.md5(password.encode("utf-8")).hexdigest())
-        self._token = ""
+        self._base_url = base_url
+        self._admission = admission
+        self._tokens = TokenManager(self._request_token, token, on_token)
         self._devices = []
+        self._session = session
+        self._owns_session = session is None
+
+    def _get_session(self) -> aiohttp.ClientSession:
+        """Return the pooled session, creating our own one on first use."""
+        if self._session is None or self._session.closed:
+            connector = aiohttp.TCPConnector(
+                limit_per_host=HTTP_CONNECTION_LIMIT,
+                keepalive_timeout=HTTP_KEEPALIVE_TIMEOUT,
+                ttl_dns_cache=HTTP_DNS_CACHE_TTL,
+            )
+            self._session = aiohttp.ClientSession(connector=connector)
+            self._owns_session = True
+        return self._session
+
+    async def close(self) -> None:
+        """Close the session if it was created by this client."""
+        if self._owns_session and self._session is not None:
+            await self._session.close()
+        self._session = None
 
     async def login(self) -> bool:
+        return await self._tokens.refresh() != ""
+
+    async def _request_token(self) -> str | None:
         params = {
             "username": self._username,
             "password": self._password,
@@ -28,224 +212,815 @@ class HTTPClient:
             "appVersion": "3.1.0",
             "identityLevel": "0",
         }
-        response = await self._get_url("/app/V1/login", params=params)
+        async with _admit(self._admission, "login"):
+            response = await self._get_url("/app/V1/login", params=params)
         if response.get("success") == False:
             LOGGER.error(f"Failed to login: {response}")
-            return False
+            return None
 
         LOGGER.info("Successfully logged in")
-        self._token = response.get("data").get("token")
-        return True
+        return response.get("data").get("token")
+
+    async def _authorized_get(self, url: str, **kwargs) -> dict:
+        """GET with the current token; on rejection, log in again and retry once.
+
+        Raises RinnaiApiError when no token can be obtained.
+        """
+        token = await self._require_token()
+        try:
+            response = await self._get_url(
+                url, headers={"Authorization": f"Bearer {token}"}, **kwargs
+            )
+        except aiohttp.ClientResponseError as e:
+            if e.status != 401:
+                raise
+            response = {"success": False, "code": 401, "message": e.message}
+        if response.get("success") == False and _is_auth_error(response):
+            # Other failures (offline or unshared devices, ...) say nothing
+            # about the token, so they neither trigger a login nor teach
+            # the token manager a lifetime.
+            LOGGER.warning(f"Request to {url} rejected, logging in again: {response}")
+            self._tokens.invalidate(token)
+            token = await self._require_token()
+            response = await self._get_url(
+                url, headers={"Authorization": f"Bearer {token}"}, **kwargs
+            )
+        return response
+
+    async def _require_token(self) -> str:
+        token = await self._tokens.get()
+        if not token:
+            # A request with an empty token only earns another rejection.
+            raise RinnaiApiError("Not logged in")
+        return token
 
     async def _get_devices(self):
-        headers = {"Authorization": f"Bearer {self._token}"}
-        return await self._get_url("/app/V1/device/list", headers=headers)
+        return await self._authorized_get("/app/V1/device/list")
 
-    async def get_devices(self) -> list[dict] | None:
-        if self._token == "":
-            await self.login()
+    async def list_devices(self) -> list[dict]:
+        """Return the account's device list; raises RinnaiApiError if it cannot be loaded.
 
+        An empty list means the account has no devices, never that the call failed.
+        """
         response = await self._get_devices()
         if response.get("success") == False:
-            LOGGER.error(f"Failed to get devices: {response}")
-            await self.login()
-            response = await self._get_devices()
-        devices = response.get("data", {}).get("list")
-
-        devices_info = {}
-        for device in devices:
-            response = await self._get_device_information(device["id"])
-            if response.get("success") == False:
-                LOGGER.error(f"Failed to get device information: {response}")
-                continue
-            devices_info[device["id"]] = {
-                "device": device,
-                "info": response.get("data"),
-            }
+            raise RinnaiApiError(f"Failed to get devices: {response}")
+        devices = (response.get("data") or {}).get("list")
+        if not isinstance(devices, list):
+            raise RinnaiApiError(f"Unexpected device list: {response}")
+        return devices
+
+    async def _fetch_device(
+        self, device: dict, semaphore: asyncio.Semaphore, timeout: float
+    ) -> tuple[dict, dict | None]:
+        async with semaphore:
+            try:
+                response = await asyncio.wait_for(
+                    self._get_device_information(device["id"]), timeout
+                )
+            except asyncio.TimeoutError:
+                LOGGER.error(f"Timed out getting device information: {device['id']}")
+                return device, None
+            except Exception as e:
+                # Malformed bodies and the like: skip this device, keep the rest.
+                LOGGER.error(f"Failed to get device information: {device['id']}, {e!r}")
+                return device, None
+        if not isinstance(response, dict) or response.get("success") == False:
+            LOGGER.error(f"Failed to get device information: {response}")
+            return device, None
+        info = response.get("data")
+        if not isinstance(info, dict):
+            LOGGER.error(f"Unexpected device information for {device['id']}: {info!r}")
+            return device, None
+        return device, info
+
+    async def iter_devices(
+        self,
+        concurrency: int = DEVICE_FETCH_CONCURRENCY,
+        timeout: float = DEVICE_FETCH_TIMEOUT,
+    ):
+        """Yield (device_id, {"device", "info"}) as each device finishes loading.
 
-        return devices_info
+        Device information is fetched concurrently, at most `concurrency` at a
+        time. A device that fails or exceeds `timeout` is skipped.
+        """
+        devices = await self.list_devices()
+        async for device, info in self.iter_device_information(devices, concurrency, timeout):
+            yield device["id"], {"device": device, "info": info}
+
+    async def iter_device_information(
+        self,
+        devices: list[dict],
+        concurrency: int = DEVICE_FETCH_CONCURRENCY,
+        timeout: float = DEVICE_FETCH_TIMEOUT,
+    ):
+        """Yield (device, info) for the given devices as each one is fetched."""
+        semaphore = asyncio.Semaphore(concurrency)
+        tasks = [
+            asyncio.ensure_future(self._fetch_device(device, semaphore, timeout))
+            for device in devices
+        ]
+        try:
+            for task in asyncio.as_completed(tasks):
+                device, info = await task
+                if info is None:
+                    continue
+                yield device, info
+        finally:
+            for task in tasks:
+                task.cancel()
+
+    async def get_devices(self) -> dict:
+        return {device_id: value async for device_id, value in self.iter_devices()}
 
     async def _get_device_information(self, device_id: str):
-        headers = {"Authorization": f"Bearer {self._token}"}
         params = {"deviceId": device_id}
-        return await self._get_url(
-            "/app/V1/device/processParameter", headers=headers, params=params
-        )
+        return await self._authorized_get("/app/V1/device/processParameter", params=params)
 
-    @backoff.on_exception(backoff.expo, aiohttp.ClientError, max_time=60)
+    @backoff.on_exception(backoff.expo, aiohttp.ClientError, max_time=60, giveup=_is_client_error)
     async def _get_url(self, url, **kwargs):
-        async with aiohttp.ClientSession(
-            base_url="https://iot.rinnai.com.cn", raise_for_status=True
-        ) as session:
-            async with session.get(url, **kwargs) as response:
-                return await response.json()
+        session = self._get_session()
+        async with session.get(
+            self._base_url + url, raise_for_status=True, **kwargs
+        ) as response:
+            return await response.json()
 
 
 class MQTTClient:
-    def __init__(self, username: str, password: str, on_message):
+    def __init__(
+        self,
+        username: str,
+        password: str,
+        on_message,
+        on_connect=None,
+        host: str = MQTT_HOST,
+        port: int = MQTT_PORT,
+        tls: bool = True,
+        persistent: bool = True,
+        metrics: MetricsRegistry | None = None,
+        admission: AdmissionController | None = None,
+        instance_id: str = "",
+    ):
         self._username = f"a:rinnai:SR:01:SR:{username}"
+        self._admission = admission
         self._password = str.upper(hashlib.md5(password.encode("utf-8")).hexdigest())
+        self._host = host
+        self._port = port
+        self._tls = tls
+        # A persistent session needs the same client id on every reconnect,
+        # and QoS 1 subscriptions for the broker to queue missed messages.
+        if persistent:
+            # Stable across restarts and reloads, so they resume the same
+            # broker session, but distinct per installation: two processes on
+            # one account sharing an id would keep disconnecting each other.
+            suffix = hashlib.sha1(f"{username}:{instance_id}".encode("utf-8")).hexdigest()[:10]
+        else:
+            ts = datetime.datetime.now()
+            suffix = f"{ts.second}{ts.microsecond}"
+        self._identifier = f"{self._username}:{suffix}"
+        self._persistent = persistent
+        self._qos = 1 if persistent else 0
         self._on_message = on_message
+        self._on_connect = on_connect
         self._client = None
+        self._topics: set[str] = set()
+        self._pending_topics: set[str] = set()
+        self._subscribe_task: asyncio.Task | None = None
+        self.resubscribe_seconds: float | None = None
+        self._connected = asyncio.Event()
+        self._outbox: asyncio.Queue = asyncio.Queue(OUTBOUND_QUEUE_SIZE)
+        self._inflight = None
+        # Raw frames are logged at INFO while tracing, otherwise sampled at DEBUG.
+        self.frame_trace = False
+        self._rx_log = LogSampler()
+        self._tx_log = LogSampler()
+        # Opt-in capture of inbound frames; file writes run in an executor.
+        self.recorder: FrameRecorder | None = None
+        self._record_flush: asyncio.Future | None = None
+        self.metrics = metrics if metrics is not None else MetricsRegistry()
+        self._messages = self.metrics.counter("mqtt_messages")
+        self._connects = self.metrics.counter("mqtt_connects")
+        self._publish_latency = self.metrics.histogram("publish_latency_ms")
+        self._resubscribe_ms = self.metrics.gauge("resubscribe_ms")
+        self._connected_since: float | None = None
+        self._connected_total = 0.0
+
+    @property
+    def connected_seconds(self) -> float:
+        """Total time connected, including the current connection."""
+        total = self._connected_total
+        if self._connected_since is not None:
+            total += time.monotonic() - self._connected_since
+        return total
+
+    @property
+    def connected(self) -> bool:
+        return self._connected.is_set()
+
+    def flush_recording(self, recorder: FrameRecorder | None = None) -> asyncio.Future | None:
+        """Write buffered frames in an executor, after any flush still running."""
+        recorder = recorder or self.recorder
+        if recorder is None:
+            return None
+        records = recorder.take()
+        if not records:
+            return self._record_flush
+        previous = self._record_flush
+
+        async def _flush():
+            if previous is not None:
+                await asyncio.shield(previous)
+            await asyncio.get_running_loop().run_in_executor(None, recorder.flush, records)
 
-    async def run(self, ssl_context=None, subscribes=[]):
-        if ssl_context is None:
+        self._record_flush = asyncio.ensure_future(_flush())
+        return self._record_flush
+
+    async def wait_connected(self) -> None:
+        await self._connected.wait()
+
+    async def run(self, ssl_context=None):
+        if not self._tls:
+            ssl_context = None
+        elif ssl_context is None:
             ssl_context = ssl.create_default_context()
-        ts = datetime.datetime.now()
+        sender = None
         try:
-            async with aiomqtt.Client(
-                "mqtt.rinnai.com.cn",
-                8883,
-                identifier=f"{self._username}:{ts.second}{ts.microsecond}",
-                username=self._username,
-                password=self._password,
-                tls_context=ssl_context,
-                tls_insecure=True,
-            ) as client:
+            async with contextlib.AsyncExitStack() as stack:
+                # Only the connect itself holds the admission slot.
+                async with _admit(self._admission, "connect"):
+                    client = await stack.enter_async_context(
+                        aiomqtt.Client(
+                            self._host,
+                            self._port,
+                            identifier=self._identifier,
+                            clean_session=not self._persistent,
+                            username=self._username,
+                            password=self._password,
+                            tls_context=ssl_context,
+                            tls_insecure=True if self._tls else None,
+                        )
+                    )
                 LOGGER.info(f"MQTT connected")
+                connected_at = time.perf_counter()
                 self._client = client
-                for mac in subscribes:
-                    await self.subscribe(mac)
+                await self._resubscribe()
+                self.resubscribe_seconds = time.perf_counter() - connected_at
+                self._resubscribe_ms.set(self.resubscribe_seconds * 1000)
+                self._connects.inc()
+                self._connected_since = time.monotonic()
+                LOGGER.info(
+                    f"Subscribed to {len(self._topics)} topics in {self.resubscribe_seconds * 1000:.1f} ms"
+                )
+                self._connected.set()
+                sender = asyncio.create_task(self._drain_outbox(client))
+                if self._on_connect is not None:
+                    await self._on_connect()
                 async for message in client.messages:
+                    self._messages.inc()
+                    if self.frame_trace:
+                        LOGGER.info("[RX] %s: %s", message.topic.value, message.payload)
+                    elif LOGGER.isEnabledFor(logging.DEBUG) and self._rx_log.allow(message.topic.value):
+                        LOGGER.debug("[RX] %s: %s", message.topic.value, message.payload)
+                    if self.recorder is not None and self.recorder.append(
+                        message.topic.value, message.payload
+                    ):
+                        self.flush_recording()
                     try:
-                        await self._on_message(
-                            message.topic.value, message.payload.decode("utf-8")
-                        )
+                        await self._on_message(message.topic.value, message.payload)
                     except Exception as e:
-                        LOGGER.error(f"Error on message: {message.payload}")
+                        LOGGER.error("Error on message: %s", message.payload)
         except aiomqtt.MqttError:
+            pass
+        finally:
+            if self._connected_since is not None:
+                self._connected_total += time.monotonic() - self._connected_since
+                self._connected_since = None
+            self._connected.clear()
+            self.flush_recording()
+            if sender is not None:
+                sender.cancel()
             self._client = None
+            if self._subscribe_task is not None:
+                self._subscribe_task.cancel()
+                self._subscribe_task = None
         LOGGER.error("MQTT task exit")
 
+    async def _resubscribe(self) -> None:
+        """Subscribe to every tracked topic with a single SUBSCRIBE."""
+        self._pending_topics.clear()
+        if self._topics:
+            await self._client.subscribe([(topic, self._qos) for topic in self._topics])
+
+    async def _flush_subscriptions(self) -> None:
+        # Let concurrent subscribe() calls queue their topics first.
+        await asyncio.sleep(0)
+        topics, self._pending_topics = self._pending_topics, set()
+        self._subscribe_task = None
+        if topics and self._client is not None:
+            await self._client.subscribe([(topic, self._qos) for topic in topics])
+
     async def subscribe(self, mac):
-        topic = f"rinnai/SR/01/SR/{mac}/+/"
-        while self._client is None:
-            await asyncio.sleep(1)
-        await self._client.subscribe(topic)
-        self._subscribed = True
+        await self.subscribe_many([mac])
+
+    def add_topics(self, macs) -> None:
+        """Track topics for macs without sending anything yet.
 
-    async def publish(self, topic: str, payload: str):
-        while self._client is None:
-            await asyncio.sleep(1)
-        await self._client.publish(topic, payload)
-        LOGGER.info(f"[Publish]: {payload}")
+        They go out with the next flush_subscriptions(), or with all other
+        topics when the connection comes up.
+        """
+        topics = {f"rinnai/SR/01/SR/{mac}/+/" for mac in macs} - self._topics
+        self._topics |= topics
+        if self._client is not None:
+            self._pending_topics |= topics
+
+    async def subscribe_many(self, macs) -> None:
+        """Track topics for macs and subscribe to them in one batch.
+
+        While disconnected the topics are only recorded; they are sent
+        together with all others as soon as the connection comes up.
+        """
+        self.add_topics(macs)
+        await self.flush_subscriptions()
+
+    async def flush_subscriptions(self) -> None:
+        """Send all topics added since the last flush in one SUBSCRIBE."""
+        if self._client is None or not self._pending_topics:
+            return
+        if self._subscribe_task is None:
+            self._subscribe_task = asyncio.ensure_future(self._flush_subscriptions())
+        await asyncio.shield(self._subscribe_task)
+
+    async def publish(
+        self, topic: str, payload: str, timeout: float = OUTBOUND_DEADLINE
+    ) -> asyncio.Future:
+        """Queue a message and return a future that resolves once it is sent.
+
+        Waits while the outbound queue is full. A message that could not be
+        sent within `timeout` seconds is dropped and its future fails with
+        TimeoutError.
+        """
+        loop = asyncio.get_running_loop()
+        queued = loop.time()
+        future = loop.create_future()
+        # Fail on time even while disconnected, when nothing drains the queue.
+        expiry = loop.call_at(queued + timeout, self._expire, future, topic)
+        future.add_done_callback(lambda _: expiry.cancel())
+        try:
+            await asyncio.wait_for(
+                self._outbox.put((queued + timeout, queued, topic, payload, future)), timeout
+            )
+        except BaseException:
+            future.cancel()
+            raise
+        return future
+
+    @staticmethod
+    def _expire(future: asyncio.Future, topic: str) -> None:
+        if not future.done():
+            LOGGER.warning(f"Dropping stale message for {topic}")
+            future.set_exception(asyncio.TimeoutError(f"Message for {topic} expired"))
+
+    async def _drain_outbox(self, client) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            if self._inflight is None:
+                self._inflight = await self._outbox.get()
+            deadline, queued, topic, payload, future = self._inflight
+            if future.done():
+                self._inflight = None
+                continue
+            if loop.time() > deadline:
+                self._expire(future, topic)
+                self._inflight = None
+                continue
+            try:
+                await client.publish(topic, payload)
+            except aiomqtt.MqttError as e:
+                # Keep the message; it is retried first after reconnecting.
+                LOGGER.warning(f"Publish failed, will retry after reconnect: {e}")
+                return
+            self._inflight = None
+            self._publish_latency.observe((loop.time() - queued) * 1000)
+            if not future.done():
+                future.set_result(None)
+            if self.frame_trace:
+                LOGGER.info("[TX] %s: %s", topic, payload)
+            elif LOGGER.isEnabledFor(logging.DEBUG) and self._tx_log.allow(topic):
+                LOGGER.debug("[TX] %s: %s", topic, payload)
+
+
+class CommandBatcher:
+    """Merge commands for one device issued within a short window into one J00 frame."""
+
+    def __init__(self, device: dict, send, window: float = COMMAND_COALESCE_WINDOW):
+        self.topic = f"rinnai/SR/01/SR/{device['mac']}/set/"
+        # The parts of the frame that never change for this device.
+        self._prefix = '{"code":%s,"id":%s,"ptn":"J00","enl":[' % (
+            json.dumps(device["authCode"]),
+            json.dumps(device["deviceType"]),
+        )
+        self._send = send
+        self._window = window
+        self._pending: dict[str, str] = {}
+        self._waiters: list[asyncio.Future] = []
+        self._timer: asyncio.TimerHandle | None = None
+
+    def build_payload(self, items: dict[str, str]) -> str:
+        enl = ",".join(
+            '{"id":%s,"data":%s}' % (json.dumps(command_id), json.dumps(command_data))
+            for command_id, command_data in items.items()
+        )
+        return f'{self._prefix}{enl}],"sum":"{len(items)}"}}'
+
+    async def put(self, command_id: str, command_data: str) -> None:
+        """Queue a command and wait until the frame carrying it was sent."""
+        while command_id in self._pending:
+            # Repeated commands such as temperature steps must each reach the
+            # device, so send what is pending before queueing this one. Loop,
+            # as another caller may have queued the same id during the flush.
+            await self.flush()
+        loop = asyncio.get_running_loop()
+        self._pending[command_id] = command_data
+        waiter = loop.create_future()
+        self._waiters.append(waiter)
+        if self._timer is None:
+            self._timer = loop.call_later(
+                self._window, lambda: asyncio.ensure_future(self.flush())
+            )
+        await waiter
+
+    async def flush(self) -> None:
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        if not self._pending:
+            return
+        items, self._pending = self._pending, {}
+        waiters, self._waiters = self._waiters, []
+        try:
+            await (await self._send(self.topic, self.build_payload(items)))
+        except Exception as e:
+            for waiter in waiters:
+                if not waiter.done():
+                    waiter.set_exception(e)
+            return
+        for waiter in waiters:
+            if not waiter.done():
+                waiter.set_result(None)
 
 
 class RinnaiClient:
-    def __init__(self, username: str, password: str):
+    def __init__(
+        self,
+        username: str,
+        password: str,
+        session: aiohttp.ClientSession | None = None,
+        on_change=None,
+        api_base_url: str = API_BASE_URL,
+        mqtt_host: str = MQTT_HOST,
+        mqtt_port: int = MQTT_PORT,
+        mqtt_tls: bool = True,
+        duplicate_window: float = DUPLICATE_FRAME_WINDOW,
+        token: dict | None = None,
+        on_token=None,
+        admission: AdmissionController | None = None,
+        instance_id: str = "",
+    ):
         self._username = username
         self._password = password
-        self._http_client = HTTPClient(self._username, self._password)
-        self._mqtt_client = MQTTClient(username, password, self._on_message)
+        self._on_change = on_change
+        self.admission = admission
+        self.metrics = MetricsRegistry()
+        self._parse_failures = self.metrics.counter("parse_failures")
+        self._command_rtt = self.metrics.histogram("command_rtt_ms")
+        self._http_client = HTTPClient(
+            self._username, self._password, session, api_base_url, token, on_token, admission
+        )
+        self._mqtt_client = MQTTClient(
+            username,
+            password,
+            self._on_message,
+            self._on_connect,
+            mqtt_host,
+            mqtt_port,
+            mqtt_tls,
+            metrics=self.metrics,
+            admission=admission,
+            instance_id=instance_id,
+        )
+        self._connected_before = False
+        self._resync_task = None
+        self._last_seen: dict[str, float] = {}
+        self.dedup = FrameDeduplicator(duplicate_window)
         self._devices = {}
+        self._mac_index = {}
         self._subscribes = {}
+        self._batchers = {}
+        self._pending_acks: dict[str, list] = {}
 
     async def login(self) -> bool:
         return await self._http_client.login()
 
-    async def get_devices(self) -> dict | None:
-        self._devices = await self._http_client.get_devices()
+    @property
+    def frame_trace(self) -> bool:
+        return self._mqtt_client.frame_trace
+
+    @frame_trace.setter
+    def frame_trace(self, enabled: bool) -> None:
+        self._mqtt_client.frame_trace = enabled
+
+    @property
+    def recording(self) -> bool:
+        return self._mqtt_client.recorder is not None
+
+    def start_recording(self, path: str, max_bytes: int = 16 * 1024 * 1024, backups: int = 3) -> None:
+        """Start appending received frames, redacted, to a rotating file at path."""
+        if self._mqtt_client.recorder is None:
+            self._mqtt_client.recorder = FrameRecorder(path, max_bytes, backups)
+            LOGGER.info(f"Recording MQTT frames to {path}")
+
+    async def stop_recording(self) -> None:
+        recorder, self._mqtt_client.recorder = self._mqtt_client.recorder, None
+        if recorder is not None:
+            flush = self._mqtt_client.flush_recording(recorder)
+            if flush is not None:
+                await flush
+            LOGGER.info(f"Stopped recording MQTT frames to {recorder.path}")
+
+    async def close(self) -> None:
+        if self._resync_task is not None:
+            self._resync_task.cancel()
+        await self.stop_recording()
+        await self._http_client.close()
+
+    async def iter_devices(self):
+        """Refresh devices, yielding each one as soon as it is loaded."""
+        listed = await self._http_client.list_devices()
+        devices = {}
+        async for device, info in self._http_client.iter_device_information(listed):
+            device_id = device["id"]
+            value = {"device": device, "info": info}
+            known = self._devices.get(device_id)
+            if known is not None:
+                # Keep the info dict subscribers hold and push only the deltas.
+                known["device"] = value["device"]
+                await self._apply_fields(device_id, value["info"])
+                value = known
+            devices[device_id] = value
+            self._devices[device_id] = value
+            self._mac_index[value["device"]["mac"]] = device_id
+            yield device_id, value
+        # Listed devices that failed to load this time keep their last state;
+        # devices the cloud no longer lists (removed, unshared) are dropped.
+        for device in listed:
+            known = self._devices.get(device["id"])
+            if device["id"] not in devices and known is not None:
+                known["device"] = device
+                devices[device["id"]] = known
+        for device_id in self._devices.keys() - devices.keys():
+            self._subscribes.pop(device_id, None)
+            self._batchers.pop(device_id, None)
+            self._last_seen.pop(device_id, None)
+        self._devices = devices
+        self._rebuild_index()
+        if self._on_change is not None:
+            self._on_change()
+
+    @property
+    def devices(self) -> dict:
         return self._devices
 
-    import re
+    @property
+    def mqtt(self) -> MQTTClient:
+        return self._mqtt_client
+
+    def last_frame_age(self, device_id: str) -> float | None:
+        """Seconds since the device last sent a frame, None if never."""
+        last_seen = self._last_seen.get(device_id)
+        return None if last_seen is None else time.monotonic() - last_seen
+
+    def load_snapshot(self, devices: dict) -> None:
+        """Start from a previously saved device list until the cloud answers."""
+        self._devices = {
+            device_id: {"device": dict(value["device"]), "info": dict(value["info"])}
+            for device_id, value in devices.items()
+        }
+        self._rebuild_index()
+
+    def _rebuild_index(self) -> None:
+        """Rebuild the MAC -> device_id index used to route MQTT topics."""
+        self._mac_index = {
+            value["device"]["mac"]: device_id
+            for device_id, value in self._devices.items()
+            if "mac" in value.get("device", {})
+        }
+
+    async def get_devices(self) -> dict | None:
+        async for _ in self.iter_devices():
+            pass
+        return self._devices
 
     async def _on_message(self, topic, payload):
-        LOGGER.info(f"[RX]: {payload}")
-        payload_str = None
         try:
             tokens = topic.split("/")
             if len(tokens) < 5:
-                LOGGER.warning("Topic unknown")
+                LOGGER.warning("Topic unknown: %s", topic)
                 return
-            mac = tokens[4]
-            device_id = None
-            for key, value in self._devices.items():
-                if "device" in value and "mac" in value["device"] and value["device"]["mac"] == mac:
-                    device_id = key
-                    break
+            if len(tokens) < 6 or tokens[5] != "res":
+                # The subscription also matches set/, so our own commands come
+                # back here; only res/ frames come from the device.
+                return
+            device_id = self._mac_index.get(tokens[4])
             if device_id is None:
-                LOGGER.warning("Device ID not found")
+                LOGGER.debug("Device ID not found for topic: %s", topic)
                 return
-            info = self._devices[key]["info"]
-
-            if isinstance(payload, bytes):
-                payload_str = payload.decode('utf-8')
-            else:
-                payload_str = str(payload)
-            payload_str = re.sub(r',\s*([}\]])', r'\1', payload_str)
-            data = json.loads(payload_str)
-
-            if data.get("ptn", "") != "J00":
+            now = self._last_seen[device_id] = time.monotonic()
+            self.metrics.counter("device_messages", device_id).inc()
+            if isinstance(payload, str):
+                payload = payload.encode("utf-8")
+            if self.dedup.is_duplicate(device_id, payload, now):
                 return
-            if "enl" in data:
-                for item in data["enl"]:
-                    if "id" in item and "data" in item:
-                        info[item["id"]] = item["data"]
-
-            on_update, _ = self._subscribes.get(device_id)
-            if on_update:
-                await on_update(info)
+
+            fields = decode_frame(payload)
+            if fields:
+                await self._apply_fields(device_id, fields)
         except UnicodeDecodeError as e:
-            LOGGER.error(f"Error decoding message: {e}, original message: {payload}")
-        except json.JSONDecodeError as e:
-            LOGGER.error(f"Error parsing JSON: {e}, original message: {payload_str}")
+            self._parse_failures.inc()
+            LOGGER.error("Error decoding message: %s, original message: %s", e, payload)
+        except ValueError as e:
+            self._parse_failures.inc()
+            LOGGER.error("Error parsing JSON: %s, original message: %s", e, payload)
         except Exception as e:
-            LOGGER.error(
-                f"Unexpected error in _on_message: {e}, original message: {payload_str if payload_str else payload}")
+            LOGGER.error("Unexpected error in _on_message: %s, original message: %s", e, payload)
+
+    async def _apply_fields(self, device_id: str, fields: dict) -> None:
+        """Merge fields into the device info and notify about the changed ones."""
+        info = self._devices[device_id]["info"]
+        changed = frozenset(
+            key for key, value in fields.items() if info.get(key) != value
+        )
+        if not changed:
+            return
+        # Copy on write: subscribers may keep the dict they were handed.
+        info = self._devices[device_id]["info"] = {**info, **fields}
+        self._confirm_acks(device_id, changed)
+        if self._on_change is not None:
+            self._on_change()
+
+        on_update, _ = self._subscribes.get(device_id, (None, None))
+        if on_update:
+            await on_update(info, changed)
+
+    async def resync(self, device_ids: list[str] | None = None) -> None:
+        """Refetch device parameters over HTTP and push whatever changed.
+
+        Defaults to all subscribed devices.
+        """
+        if device_ids is None:
+            device_ids = list(self._subscribes)
+        devices = [
+            self._devices[device_id]["device"]
+            for device_id in device_ids
+            if device_id in self._devices
+        ]
+        async for device, info in self._http_client.iter_device_information(devices):
+            await self._apply_fields(device["id"], info)
+
+    async def _on_connect(self) -> None:
+        # Whatever arrives first after a reconnect must be applied.
+        self.dedup.reset()
+        if self._connected_before and (
+            self._resync_task is None or self._resync_task.done()
+        ):
+            self._resync_task = asyncio.create_task(self._resync_missed(time.monotonic()))
+        self._connected_before = True
+
+    async def _resync_missed(self, connected_at: float) -> None:
+        """Resync the devices that stayed silent since the reconnect.
+
+        The broker replays what it queued for a persistent session right after
+        connecting; only devices not heard from within the grace period are
+        refetched over HTTP.
+        """
+        await asyncio.sleep(RESYNC_GRACE)
+        stale = [
+            device_id
+            for device_id in self._subscribes
+            if self._last_seen.get(device_id, 0) < connected_at
+        ]
+        if stale:
+            LOGGER.info(f"Resyncing {len(stale)} of {len(self._subscribes)} devices")
+            await self.resync(stale)
 
     async def run(self, ssl_context=None):
-        BACKOFF_INIT = 10
-        MAX_BACKOFF = 3600
-        NEED_BACKOFF_SECONDS = datetime.timedelta(seconds=60)
-        backoff = BACKOFF_INIT
-        now = datetime.datetime.now()
-        subscribes = []
+        delay = RECONNECT_BASE
         while True:
+            started = time.monotonic()
             try:
                 LOGGER.info("Trying to connect to MQTT server...")
-                await self._mqtt_client.run(ssl_context, subscribes)
+                await self._mqtt_client.run(ssl_context)
             except Exception as e:
                 LOGGER.error(f"MQTT connection error: {e}")
-            if datetime.datetime.now() - now < NEED_BACKOFF_SECONDS:
-                await self.get_devices()
-                backoff = backoff << 1
-                if backoff > MAX_BACKOFF:
-                    backoff = MAX_BACKOFF
-            else:
-                backoff = BACKOFF_INIT
-            LOGGER.warning(f"Reconnecting in {backoff} seconds")
-            await asyncio.sleep(backoff)
-            subscribes = []
-            for _, (_, mac) in self._subscribes.items():
-                subscribes.append(mac)
-
-    async def subscribe(self, device_id: str, on_update):
+            # Decorrelated jitter: spread reconnects out without letting a
+            # short cloud blip turn into a long outage.
+            if time.monotonic() - started >= STABLE_CONNECTION:
+                delay = RECONNECT_BASE
+            delay = min(RECONNECT_CAP, random.uniform(RECONNECT_BASE, delay * 3))
+            LOGGER.warning(f"Reconnecting in {delay:.1f} seconds")
+            await asyncio.sleep(delay)
+
+    async def subscribe(self, device_id: str, on_update, flush: bool = True):
+        """Deliver the device's updates to on_update.
+
+        With flush=False the MQTT topic is only recorded; call
+        flush_subscriptions() once after subscribing many devices so they
+        share one SUBSCRIBE.
+        """
         if device_id not in self._devices:
             LOGGER.error(f"Unknown device_id: {device_id}")
             return False
         mac = self._devices[device_id]["device"]["mac"]
         self._subscribes[device_id] = (on_update, mac)
-        await on_update(self._devices[device_id]["info"])
-        await self._mqtt_client.subscribe(mac)
-
-    async def publish(self, device: dict, command_id, command_data):
-        payload = {
-            "code": device["authCode"],
-            "id": device["deviceType"],
-            "ptn": "J00",
-            "enl": [{"id": command_id, "data": command_data}],
-            "sum": "1",
-        }
-        mac = device["mac"]
-        await self._mqtt_client.publish(f"rinnai/SR/01/SR/{mac}/set/", json.dumps(payload))
+        info = self._devices[device_id]["info"]
+        await on_update(info, frozenset(info))
+        self._mqtt_client.add_topics([mac])
+        if flush:
+            await self._mqtt_client.flush_subscriptions()
+
+    async def flush_subscriptions(self) -> None:
+        await self._mqtt_client.flush_subscriptions()
+
+    async def publish(
+        self,
+        device: dict,
+        command_id,
+        command_data,
+        ack_field: str | None = None,
+        ack_timeout: float = COMMAND_ACK_TIMEOUT,
+    ) -> asyncio.Future | None:
+        """Send a command to the device.
+
+        With ack_field, returns a future that resolves to the round-trip time
+        in seconds once a res/ frame changes that field, or fails with
+        TimeoutError after ack_timeout seconds.
+        """
+        ack = None
+        if ack_field is not None:
+            ack = self._expect_ack(device["id"], ack_field, ack_timeout)
+        batcher = self._batchers.get(device["id"])
+        if batcher is None:
+            batcher = self._batchers[device["id"]] = CommandBatcher(
+                device, self._mqtt_client.publish
+            )
+        try:
+            await batcher.put(command_id, command_data)
+        except BaseException:
+            if ack is not None:
+                ack.cancel()
+            raise
+        return ack
+
+    def _expect_ack(self, device_id: str, field: str, timeout: float) -> asyncio.Future:
+        loop = asyncio.get_running_loop()
+        ack = loop.create_future()
+        entry = (field, loop.time(), ack)
+        pending = self._pending_acks.setdefault(device_id, [])
+        pending.append(entry)
+
+        def expire() -> None:
+            if entry in pending:
+                pending.remove(entry)
+            if not ack.done():
+                ack.set_exception(
+                    asyncio.TimeoutError(f"{field} not confirmed within {timeout}s")
+                )
+
+        timer = loop.call_later(timeout, expire)
+        ack.add_done_callback(lambda _: timer.cancel())
+        return ack
+
+    def _confirm_acks(self, device_id: str, changed: frozenset) -> None:
+        pending = self._pending_acks.get(device_id)
+        if not pending:
+            return
+        now = asyncio.get_running_loop().time()
+        for entry in [entry for entry in pending if entry[0] in changed]:
+            pending.remove(entry)
+            _, sent, ack = entry
+            if not ack.done():
+                self._command_rtt.observe((now - sent) * 1000)
+                ack.set_result(now - sent)
 
 
 # define main entry for testing
 async def main():
+    logging.basicConfig(level=logging.DEBUG)
+
     async def on_message(topic: str, payload: str):
-        await on_update(json.loads(payload))
+        msg = json.loads(payload)
+        await on_update(msg, frozenset(msg))
 
-    async def on_update(msg: str):
+    async def on_update(msg: dict, changed: frozenset):
         print(f"Update: {json.dumps(msg)}")
 
     client = RinnaiClient("<USERNAME>", "<PASSWORD>")
@@ -258,6 +1033,7 @@ async def main():
     # await client.subscribe("<MAC>")
     await asyncio.sleep(600)
     task.cancel()
+    await client.close()
 
     """
     login
@@ -22,7 +22,9 @@ class RinnaiSelect(RinnaiEntity, SelectEntity):
         if select_dict.get("icon"):
             self._attr_icon = select_dict["icon"]
         self._select_dict = select_dict
-        super().__init__(select_dict["entity_type"], select_dict["name"], device)
+        super().__init__(
+            select_dict["entity_type"], select_dict["name"], device, select_dict.get("fields")
+        )
 
     @property
     def current_option(self):
@@ -0,0 +1,136 @@
+from __future__ import annotations
+
+import time
+from datetime import timedelta
+
+from homeassistant.components.sensor import SensorEntity, SensorStateClass
+from homeassistant.const import CONF_USERNAME, EntityCategory
+from homeassistant.helpers.device_registry import DeviceEntryType
+from homeassistant.helpers.entity import DeviceInfo
+
+from .const import (
+    ACCOUNT_SENSORS,
+    CLIENT,
+    DEVICE_SENSORS,
+    DOMAIN as RINNAI_DOMAIN,
+    MANUFACTURER,
+    TITLE,
+)
+from .device import RinnaiDeviceDataUpdateCoordinator
+from .entity import RinnaiEntity
+from .rinnai_client import RinnaiClient
+
+# Metrics live in memory, so polling them does not touch the cloud.
+SCAN_INTERVAL = timedelta(seconds=30)
+
+
+async def async_setup_entry(hass, config_entry, async_add_entities):
+    """Set up the Rinnai diagnostic sensors from config entry."""
+    data = hass.data[RINNAI_DOMAIN][config_entry.entry_id]
+    client: RinnaiClient = data[CLIENT]
+    devices: list[RinnaiDeviceDataUpdateCoordinator] = data["devices"]
+    entities = [
+        RinnaiAccountSensor(sensor, client, config_entry) for sensor in ACCOUNT_SENSORS
+    ]
+    for device in devices:
+        entities.extend(
+            [RinnaiDeviceSensor(sensor, client, device) for sensor in DEVICE_SENSORS]
+        )
+    async_add_entities(entities)
+
+
+class _MetricSensor(SensorEntity):
+    _attr_entity_category = EntityCategory.DIAGNOSTIC
+    _attr_entity_registry_enabled_default = False
+    _attr_should_poll = True
+
+    def _init_metric(self, sensor_dict) -> None:
+        if sensor_dict.get("icon"):
+            self._attr_icon = sensor_dict["icon"]
+        self._attr_native_unit_of_measurement = sensor_dict.get("unit")
+        self._attr_state_class = SensorStateClass(sensor_dict["state_class"])
+        self._sensor_dict = sensor_dict
+
+
+class RinnaiAccountSensor(_MetricSensor):
+    """A metric of the account's cloud connection."""
+
+    def __init__(self, sensor_dict, client: RinnaiClient, config_entry) -> None:
+        self._init_metric(sensor_dict)
+        self._client = client
+        self._attr_name = sensor_dict["name"]
+        self._attr_unique_id = f"{config_entry.entry_id}_{sensor_dict['entity_type']}"
+        self._attr_device_info = DeviceInfo(
+            identifiers={(RINNAI_DOMAIN, config_entry.entry_id)},
+            manufacturer=MANUFACTURER,
+            name=f"{TITLE} {config_entry.data[CONF_USERNAME]}",
+            entry_type=DeviceEntryType.SERVICE,
+        )
+        self._last_messages: int | None = None
+        self._last_time = time.monotonic()
+
+    def update(self) -> None:
+        metrics = self._client.metrics
+        match self._sensor_dict["entity_type"]:
+            case "message_rate":
+                messages = metrics.counter("mqtt_messages").value
+                now = time.monotonic()
+                if self._last_messages is not None and now > self._last_time:
+                    self._attr_native_value = round(
+                        (messages - self._last_messages) * 60 / (now - self._last_time), 1
+                    )
+                self._last_messages, self._last_time = messages, now
+            case "parse_failures":
+                self._attr_native_value = metrics.counter("parse_failures").value
+            case "duplicate_frames":
+                self._attr_native_value = self._client.dedup.hits
+                self._attr_extra_state_attributes = {"accepted": self._client.dedup.misses}
+            case "reconnects":
+                self._attr_native_value = max(0, metrics.counter("mqtt_connects").value - 1)
+            case "connected_time":
+                self._attr_native_value = round(self._client.mqtt.connected_seconds)
+            case "command_rtt":
+                self._set_latency(metrics.histogram("command_rtt_ms"))
+            case "publish_latency":
+                self._set_latency(metrics.histogram("publish_latency_ms"))
+            case "admission_queued":
+                # Shared by all entries, so every account reports the same values.
+                admission = self._client.admission
+                if admission is not None:
+                    self._attr_native_value = admission.total_queued
+                    self._attr_extra_state_attributes = {
+                        "in_flight": admission.total_in_flight,
+                        "queued_by_kind": dict(admission.queued),
+                        "in_flight_by_kind": dict(admission.in_flight),
+                        "admitted": dict(admission.admitted),
+                    }
+
+    def _set_latency(self, latency) -> None:
+        self._attr_native_value = latency.quantile(0.95)
+        self._attr_extra_state_attributes = {
+            "count": latency.count,
+            "mean": None if latency.mean is None else round(latency.mean, 1),
+            "p50": latency.quantile(0.5),
+        }
+
+
+class RinnaiDeviceSensor(RinnaiEntity, _MetricSensor):
+    """A metric of one device's message stream."""
+
+    _attr_should_poll = True
+
+    def __init__(self, sensor_dict, client: RinnaiClient, device) -> None:
+        self._init_metric(sensor_dict)
+        self._client = client
+        # Polled, so no device fields to listen to.
+        super().__init__(sensor_dict["entity_type"], sensor_dict["name"], device, ())
+
+    def update(self) -> None:
+        match self._sensor_dict["entity_type"]:
+            case "last_frame_age":
+                age = self._client.last_frame_age(self._device.id)
+                self._attr_native_value = None if age is None else round(age)
+            case "messages":
+                self._attr_native_value = self._client.metrics.counter(
+                    "device_messages", self._device.id
+                ).value
@@ -0,0 +1,144 @@
+"""Closed-loop temperature setpoint for devices that only accept up/down steps."""
+
+import asyncio
+from collections.abc import Awaitable, Callable
+
+from .const import LOGGER
+
+STEP_UP = "01"
+STEP_DOWN = "00"
+MAX_TIMEOUT_FACTOR = 8
+
+
+class TemperatureSetpoint:
+    """Drive the device setpoint to an absolute target.
+
+    The device only understands `hotWaterTempOperate` up/down steps. Steps are
+    pipelined, at most `max_in_flight` ahead of what the device has confirmed
+    on its res/ topic, and sent no faster than one per `step_interval`
+    seconds. Steps the device never confirms are sent again once the setpoint
+    has stopped moving, and an overshoot is corrected in the other direction.
+    Setting a new target cancels the one in flight.
+    """
+
+    def __init__(
+        self,
+        read_current: Callable[[], int | None],
+        send_step: Callable[[str], Awaitable[None]],
+        on_done: Callable[[], None],
+        step_interval: float = 0.3,
+        max_in_flight: int = 2,
+        step_timeout: float = 5.0,
+        max_stalls: int = 3,
+    ):
+        self._read_current = read_current
+        self._send_step = send_step
+        self._on_done = on_done
+        self._step_interval = step_interval
+        self._max_in_flight = max_in_flight
+        self._step_timeout = step_timeout
+        self._max_stalls = max_stalls
+        self._progress = asyncio.Event()
+        self._task: asyncio.Task | None = None
+        self.target: int | None = None
+
+    @property
+    def active(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    def notify(self) -> None:
+        """Call when the device reported a new setpoint."""
+        self._progress.set()
+
+    def set_target(self, target: int) -> asyncio.Task:
+        self.cancel()
+        self.target = target
+        self._progress.clear()
+        self._task = asyncio.ensure_future(self._drive(target))
+        return self._task
+
+    def cancel(self) -> None:
+        if self._task is not None and not self._task.done():
+            self._task.cancel()
+        self._task = None
+
+    async def _drive(self, target: int) -> None:
+        try:
+            await self._run(target)
+        except asyncio.CancelledError:
+            # Superseded by a newer target; that one reports when it is done.
+            raise
+        except Exception as e:
+            LOGGER.error(f"Setting temperature to {target} failed: {e}")
+        self.target = None
+        self._on_done()
+
+    async def _run(self, target: int) -> None:
+        current = self._read_current()
+        if current is None:
+            return
+        # Degrees per step: the smallest change seen, 1 until the first one.
+        step = 1
+        step_known = False
+        # Steps sent but not yet reflected in current; positive means up.
+        in_flight = 0
+        # Steps given up on after a stall, which may still arrive late.
+        written_off = 0
+        # Grows when written-off steps turn out to have been only slow.
+        timeout = self._step_timeout
+        stalls = 0
+        while True:
+            error = target - current
+            remaining = error - in_flight * step
+            direction = 1 if remaining > 0 else -1
+            if in_flight == 0 and abs(error) < step:
+                # Reached, or as close as the device's increment allows.
+                if not written_off or not await self._wait_for_progress(timeout):
+                    return
+            elif (
+                abs(remaining) >= step
+                and in_flight * direction >= 0
+                and abs(in_flight) < self._max_in_flight
+            ):
+                # Also reverses after an overshoot, once the steps in flight
+                # have settled.
+                await self._send_step(STEP_UP if direction > 0 else STEP_DOWN)
+                in_flight += direction
+                await asyncio.sleep(self._step_interval)
+            elif not await self._wait_for_progress(timeout) and self._read_current() in (None, current):
+                # The setpoint stopped moving, so the outstanding steps were
+                # lost or are too slow to wait for; send them again.
+                stalls += 1
+                if stalls >= self._max_stalls:
+                    LOGGER.warning(f"Setpoint stuck at {current}, giving up on target {target}")
+                    return
+                written_off += abs(in_flight)
+                in_flight = 0
+                continue
+            latest = self._read_current()
+            if latest is None or latest == current:
+                continue
+            delta = latest - current
+            current = latest
+            stalls = 0
+            step = min(step, abs(delta)) if step_known else abs(delta)
+            step_known = True
+            steps = max(1, round(abs(delta) / step))
+            if written_off:
+                # Steps written off were sent first, so they arrive first.
+                late = min(steps, written_off)
+                written_off -= late
+                steps -= late
+                timeout = min(timeout * 2, self._step_timeout * MAX_TIMEOUT_FACTOR)
+            if steps and in_flight * delta > 0:
+                confirmed = min(steps, abs(in_flight))
+                in_flight -= confirmed if in_flight > 0 else -confirmed
+
+    async def _wait_for_progress(self, timeout: float) -> bool:
+        """Wait up to timeout seconds for a new setpoint; False if none came."""
+        self._progress.clear()
+        try:
+            await asyncio.wait_for(self._progress.wait(), timeout)
+        except asyncio.TimeoutError:
+            return False
+        return True
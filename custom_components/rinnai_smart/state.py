@@ -0,0 +1,67 @@
+"""Decoded, immutable snapshot of a device's parameters."""
+
+from collections.abc import Mapping
+from types import MappingProxyType
+
+from . import reservation
+from .const import CYCLE_MODE_MAP, OPERATION_MAP
+
+
+def _hex(value: str | None) -> int | None:
+    try:
+        return int(value, 16)
+    except (TypeError, ValueError):
+        return None
+
+
+class DeviceState:
+    """Everything the entities read, decoded once per frame.
+
+    The coordinator builds a new instance for every update and swaps it in,
+    so readers always see one complete frame. Instances cannot be modified.
+    """
+
+    __slots__ = (
+        "raw",
+        "target_temperature",
+        "operation_mode",
+        "is_on",
+        "is_heating",
+        "cycle_mode",
+        "is_cycle_reservation_on",
+        "is_temporary_cycle_insulation_on",
+        "cycle_reservation_hours",
+        "cycle_reservation_time",
+    )
+
+    def __init__(self, info: Mapping[str, str]):
+        set_ = object.__setattr__
+        set_(self, "raw", MappingProxyType(info))
+        set_(self, "target_temperature", _hex(info.get("hotWaterTempSetting")))
+        operation_mode = _hex(info.get("operationMode"))
+        set_(
+            self,
+            "operation_mode",
+            None if operation_mode is None else OPERATION_MAP.get("%02X" % (operation_mode & 0xBF)),
+        )
+        set_(self, "is_on", info.get("operationMode") != "0")
+        set_(self, "is_heating", info.get("burningState") == "1")
+        set_(self, "cycle_mode", CYCLE_MODE_MAP.get(info.get("cycleModeSetting")))
+        set_(self, "is_cycle_reservation_on", info.get("cycleReservationSetting1") == "1")
+        set_(
+            self,
+            "is_temporary_cycle_insulation_on",
+            info.get("temporaryCycleInsulationSetting") == "31",
+        )
+        try:
+            hours = reservation.decode(info.get("cycleReservationTimeSetting", ""))
+        except ValueError:
+            hours = ()
+        set_(self, "cycle_reservation_hours", hours)
+        set_(self, "cycle_reservation_time", reservation.format_hours(hours))
+
+    def __setattr__(self, name, value):
+        raise AttributeError(f"{type(self).__name__} is immutable")
+
+    def __delattr__(self, name):
+        raise AttributeError(f"{type(self).__name__} is immutable")
@@ -22,7 +22,9 @@ class RinnaiSwitch(RinnaiEntity, SwitchEntity):
         if switch_dict.get("icon"):
             self._attr_icon = switch_dict["icon"]
         self._switch_dict = switch_dict
-        super().__init__(switch_dict["entity_type"], switch_dict["name"], device)
+        super().__init__(
+            switch_dict["entity_type"], switch_dict["name"], device, switch_dict.get("fields")
+        )
 
     @property
     def is_on(self):
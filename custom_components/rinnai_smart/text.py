@@ -24,7 +24,9 @@ class RinnaiText(RinnaiEntity, TextEntity):
         self._text_dict = text_dict
         if text_dict.get("icon"):
             self._attr_icon = text_dict["icon"]
-        super().__init__(text_dict["entity_type"], text_dict["name"], device)
+        super().__init__(
+            text_dict["entity_type"], text_dict["name"], device, text_dict.get("fields")
+        )
 
     @property
     def pattern(self):
@@ -0,0 +1,104 @@
+"""Hourly burn time and ignition counts aggregated from burningState.
+
+The tracker is fed the burner state whenever it changes and keeps a fixed ring
+of hourly buckets plus running totals, so memory stays constant and each
+update only touches the buckets between the previous update and now.
+"""
+
+HOUR = 3600
+HOURS_KEPT = 48
+
+
+class UsageTracker:
+    """Aggregate burner on-time and ignitions into hourly buckets.
+
+    Timestamps are UNIX seconds, so bucket starts line up with UTC hours as
+    long-term statistics expect.
+    """
+
+    def __init__(self, hours: int = HOURS_KEPT):
+        self._hours = hours
+        # Per slot: [hour start, burn seconds, ignitions]; hour start None when unused.
+        self._ring: list[list] = [[None, 0.0, 0] for _ in range(hours)]
+        self.burning: bool | None = None
+        self._since: float | None = None
+        self.total_burn_seconds = 0.0
+        self.total_ignitions = 0
+        self.exported_until: int | None = None
+
+    def _slot(self, hour: int) -> list:
+        slot = self._ring[(hour // HOUR) % self._hours]
+        if slot[0] != hour:
+            slot[0], slot[1], slot[2] = hour, 0.0, 0
+        return slot
+
+    def _accumulate(self, until: float) -> None:
+        """Credit burn time from the last update up to until."""
+        start = self._since
+        if start is None or until <= start:
+            return
+        self.total_burn_seconds += until - start
+        # Far older than the ring would be overwritten anyway.
+        start = max(start, until - self._hours * HOUR)
+        while start < until:
+            hour = int(start // HOUR * HOUR)
+            end = min(until, hour + HOUR)
+            self._slot(hour)[1] += end - start
+            start = end
+
+    def update(self, burning: bool, now: float) -> None:
+        """Record the burner state observed at now."""
+        if self.burning:
+            self._accumulate(now)
+        if burning and self.burning is False:
+            self._slot(int(now // HOUR * HOUR))[2] += 1
+            self.total_ignitions += 1
+        self.burning = burning
+        self._since = now
+
+    def advance(self, now: float) -> None:
+        """Bring the buckets up to now without a new observation."""
+        if self.burning is not None:
+            self.update(self.burning, now)
+
+    def completed_hours(self, now: float) -> list[tuple[int, float, int]]:
+        """Return (hour start, burn seconds, ignitions) for finished hours not yet exported.
+
+        Hours without any observation are left out; call mark_exported() once
+        the batch has been stored.
+        """
+        current = int(now // HOUR * HOUR)
+        first = current - self._hours * HOUR
+        if self.exported_until is not None:
+            first = max(first, self.exported_until + HOUR)
+        return sorted(
+            (slot[0], slot[1], slot[2])
+            for slot in self._ring
+            if slot[0] is not None and first <= slot[0] < current
+        )
+
+    def mark_exported(self, hour: int) -> None:
+        self.exported_until = hour
+
+    def as_dict(self) -> dict:
+        """Return the JSON-serialisable state, for storing across restarts."""
+        return {
+            "ring": [list(slot) for slot in self._ring],
+            "burning": self.burning,
+            "total_burn_seconds": self.total_burn_seconds,
+            "total_ignitions": self.total_ignitions,
+            "exported_until": self.exported_until,
+        }
+
+    def restore(self, state: dict | None) -> None:
+        """Load what as_dict() returned.
+
+        The burner state is not restored: nothing is known about the time the
+        process was down, so the next observation starts a fresh interval.
+        """
+        if not state or len(state.get("ring", ())) != self._hours:
+            return
+        self._ring = [list(slot) for slot in state["ring"]]
+        self.total_burn_seconds = state.get("total_burn_seconds", 0.0)
+        self.total_ignitions = state.get("total_ignitions", 0)
+        self.exported_until = state.get("exported_until")
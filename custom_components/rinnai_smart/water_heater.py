@@ -8,7 +8,7 @@ from homeassistant.components.water_heater import (
 )
 from homeassistant.const import UnitOfTemperature
 
-from .const import DOMAIN, OPERATION_MAP, WATER_HEATER, MIN_TEMP, MAX_TEMP, LOGGER
+from .const import DOMAIN, OPERATION_MAP, WATER_HEATER, WATER_HEATER_FIELDS, MIN_TEMP, MAX_TEMP, LOGGER
 from .device import RinnaiDeviceDataUpdateCoordinator
 from .entity import RinnaiEntity
 
@@ -40,7 +40,7 @@ class RinnaiWaterHeater(RinnaiEntity, WaterHeaterEntity):
 
     def __init__(self, device: RinnaiDeviceDataUpdateCoordinator) -> None:
         """Initialize the water heater."""
-        super().__init__("water_heater", WATER_HEATER, device)
+        super().__init__("water_heater", WATER_HEATER, device, WATER_HEATER_FIELDS)
 
     @property
     def current_operation(self):
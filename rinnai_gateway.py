@@ -0,0 +1,24 @@
+"""Run the headless Rinnai gateway: python rinnai_gateway.py gateway.json
+
+The integration package's __init__ imports Home Assistant, which the gateway
+does not need, so the package is registered as a bare module before importing
+rinnai_smart.gateway. Requires aiohttp, aiomqtt and backoff; uvloop is used
+when installed.
+"""
+
+import pathlib
+import sys
+import types
+
+PACKAGE = "rinnai_smart"
+PACKAGE_DIR = pathlib.Path(__file__).resolve().parent / "custom_components" / PACKAGE
+
+if PACKAGE not in sys.modules:
+    package = types.ModuleType(PACKAGE)
+    package.__path__ = [str(PACKAGE_DIR)]
+    sys.modules[PACKAGE] = package
+
+from rinnai_smart.gateway import main  # noqa: E402
+
+if __name__ == "__main__":
+    main()